@@ -1,11 +1,37 @@
+import argparse
+import hashlib
+import json
 import math
+import os
+import re
+import sys
+import threading
+import time
+#0: debug, 1: production
+GAME_MODE = 0
+#headless runs draw through EGL, and PyOpenGL settles on its platform the first time OpenGL is imported
+HEADLESS = "--headless" in sys.argv or "--benchmark" in sys.argv
+if HEADLESS:
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
 import glfw
 import glfw.GLFW as GLFW_CONSTANTS
+import OpenGL
+#PyOpenGL calls glGetError after every gl call, which waits on the driver each time. production builds turn that
+#off before the gl functions are made, except headless ones whose EGL bindings cannot import without it
+OpenGL.ERROR_CHECKING = GAME_MODE == 0 or HEADLESS
 from OpenGL.GL import *
 from OpenGL.GL.shaders import compileProgram,compileShader
+from OpenGL.GL.EXT.texture_compression_s3tc import GL_COMPRESSED_RGB_S3TC_DXT1_EXT, GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v as glGetQueryObjectui64vRaw
+#runs glGetError after every gl call, None when PyOpenGL's error checking is off
+from OpenGL.raw.GL._errors import _error_checker as glErrorChecker
 import numpy as np
 import pyrr
 import ctypes
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image, ImageOps
 from typing import List
 
@@ -18,8 +44,257 @@ SCREEN_HEIGHT = 480
 RETURN_ACTION_CONTINUE = 0
 RETURN_ACTION_EXIT = 1
 
-#0: debug, 1: production
-GAME_MODE = 0
+#frames between glGetError reads when the driver has no debug output, each read waits on the driver
+DEBUG_ERROR_INTERVAL = 60
+#debug message severities reported, the driver drops the rest before calling back
+DEBUG_SEVERITIES = (GL_DEBUG_SEVERITY_HIGH, GL_DEBUG_SEVERITY_MEDIUM, GL_DEBUG_SEVERITY_LOW)
+#readable names for the debug messages' enums
+DEBUG_SOURCE_NAMES = {
+    GL_DEBUG_SOURCE_API: "api", GL_DEBUG_SOURCE_WINDOW_SYSTEM: "window system",
+    GL_DEBUG_SOURCE_SHADER_COMPILER: "shader compiler", GL_DEBUG_SOURCE_THIRD_PARTY: "third party",
+    GL_DEBUG_SOURCE_APPLICATION: "application", GL_DEBUG_SOURCE_OTHER: "other",
+}
+DEBUG_TYPE_NAMES = {
+    GL_DEBUG_TYPE_ERROR: "error", GL_DEBUG_TYPE_DEPRECATED_BEHAVIOR: "deprecated",
+    GL_DEBUG_TYPE_UNDEFINED_BEHAVIOR: "undefined behavior", GL_DEBUG_TYPE_PORTABILITY: "portability",
+    GL_DEBUG_TYPE_PERFORMANCE: "performance", GL_DEBUG_TYPE_MARKER: "marker",
+    GL_DEBUG_TYPE_PUSH_GROUP: "push group", GL_DEBUG_TYPE_POP_GROUP: "pop group", GL_DEBUG_TYPE_OTHER: "other",
+}
+DEBUG_SEVERITY_NAMES = {
+    GL_DEBUG_SEVERITY_HIGH: "high", GL_DEBUG_SEVERITY_MEDIUM: "medium",
+    GL_DEBUG_SEVERITY_LOW: "low", GL_DEBUG_SEVERITY_NOTIFICATION: "notification",
+}
+GL_ERROR_NAMES = {
+    GL_INVALID_ENUM: "GL_INVALID_ENUM", GL_INVALID_VALUE: "GL_INVALID_VALUE",
+    GL_INVALID_OPERATION: "GL_INVALID_OPERATION", GL_INVALID_FRAMEBUFFER_OPERATION: "GL_INVALID_FRAMEBUFFER_OPERATION",
+    GL_OUT_OF_MEMORY: "GL_OUT_OF_MEMORY", GL_STACK_UNDERFLOW: "GL_STACK_UNDERFLOW", GL_STACK_OVERFLOW: "GL_STACK_OVERFLOW",
+}
+
+#seconds of simulated time per Scene.update, frames draw between the last two steps
+SIMULATION_STEP = 1 / 60
+#steps a single frame may run, past this the simulation gives up catching up
+MAX_SIMULATION_STEPS = 8
+#longest frame delta the clock reports, a stall (window drag, breakpoint) is not replayed
+MAX_FRAME_DELTA = 0.25
+#frames per second the window is held to, None for uncapped, vsync paces it when turned on
+FRAME_CAP = None
+VSYNC = False
+#seconds before a frame's deadline the limiter stops sleeping and spins, grows if sleeps run late
+#but never past SLEEP_SPIN_LIMIT, a frame may end a little late rather than keep a core busy
+SLEEP_SPIN_MARGIN = 0.0002
+SLEEP_SPIN_LIMIT = 0.0008
+#longest single sleep while waiting for a deadline, short sleeps overshoot less
+SLEEP_SLICE = 0.001
+
+#frames a headless run renders when neither --frames nor a camera script says otherwise
+HEADLESS_FRAMES = 60
+
+#frames drawn before a benchmark scenario starts recording, the first ones compile shaders and bake shadows
+BENCHMARK_WARMUP_FRAMES = 10
+#share a result may be slower than its baseline before the run fails
+BENCHMARK_THRESHOLD = 0.15
+#milliseconds a result must also lose before it counts, stages that take microseconds are all noise
+BENCHMARK_NOISE_FLOOR = 0.1
+#startups after the cold one, warm startup is their median
+BENCHMARK_WARM_STARTUPS = 5
+#mesh and texture caches here are removed before the cold startup so it parses and decodes every asset
+BENCHMARK_CACHE_DIRECTORIES = ("models", "gfx")
+#per-frame cpu times a benchmark records, frame is update through the end of the gpu's work,
+#gpu_ stages are the gpu profiler's pass times
+BENCHMARK_STAGES = ("scene_update", "setup", "shadow", "main", "translucent", "frame",
+                    "gpu_shadow", "gpu_main", "gpu_translucent")
+#percentiles checked against the baseline, p99 is reported but too noisy to fail on
+BENCHMARK_CHECKED = ("p50", "p95")
+#camera keys are {position, theta, phi}, object keys are positions of the moveable object,
+#both are spread evenly over the scenario's frames and interpolated between
+BENCHMARK_SCENARIOS = {
+    #nothing moves, every shadow comes from its last draw
+    "still": {
+        "frames": 120,
+        "camera": [{"position": [0, 0, 2], "theta": 0, "phi": -10}],
+        "object": [[2, 0, -1]],
+    },
+    #camera circles the lamp, the main pass sees every side of the scene and culls some of it
+    "orbit": {
+        "frames": 240,
+        "camera": [
+            {"position": [1, 0, 2], "theta": 0, "phi": -15},
+            {"position": [6, -5, 2], "theta": 90, "phi": -15},
+            {"position": [11, 0, 2], "theta": 180, "phi": -15},
+            {"position": [6, 5, 2], "theta": 270, "phi": -15},
+            {"position": [1, 0, 2], "theta": 360, "phi": -15},
+        ],
+        "object": [[2, 0, -1]],
+    },
+    #the moveable object circles under the light, its shadow is redrawn every frame
+    "moving_object": {
+        "frames": 240,
+        "camera": [{"position": [0, 0, 2], "theta": 0, "phi": -10}],
+        "object": [[2, 0, -1], [6, -3, -1], [10, 0, -1], [6, 3, -1], [2, 0, -1]],
+    },
+}
+
+#binary sidecar written next to each model the first time it is parsed
+MESH_CACHE_EXTENSION = ".meshcache"
+MESH_CACHE_VERSION = 6
+#cache sources are hashed in blocks of this many bytes
+HASH_BLOCK_SIZE = 1024 * 1024
+MESH_CACHE_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("sourceSize", "<u8"),
+    ("sourceMtime", "<i8"),
+    ("sourceHash", "S32"),
+    ("vertexCount", "<u8"),
+    ("indexCount", "<u8"),
+    ("indexSize", "<u4"),
+    ("submeshCount", "<u4"),
+    ("lodCount", "<u4"),
+    #the settings the levels of detail were built with, a cache built with others is rebuilt
+    ("lodReduction", "<f8"),
+    ("lodLevels", "<u4"),
+    ("lodMaxTriangles", "<u8"),
+    ("bounds", "<f4", (2, 3))
+])
+MESH_CACHE_SUBMESH = np.dtype([
+    ("objectName", "S64"),
+    ("material", "S64"),
+    ("firstIndex", "<u8"),
+    ("indexCount", "<u8")
+])
+#one entry per level of detail, the first is the full mesh, error is the largest deviation in model units
+MESH_CACHE_LOD = np.dtype([
+    ("firstIndex", "<u8"),
+    ("indexCount", "<u8"),
+    ("error", "<f4")
+])
+
+#each level of detail keeps about this share of the previous level's triangles, at most this many below the full mesh
+LOD_REDUCTION = 0.5
+LOD_LEVELS = 4
+#meshes with more triangles than this load without coarser levels, simplify them offline instead
+LOD_MAX_TRIANGLES = 100000
+#screen pixels a level's error may cover before a finer level is drawn, scaled per pass
+LOD_ERROR_PIXELS = 1.0
+LOD_PASS_BIAS = {"main": 1.0, "shadow": 4.0}
+
+#point lights the shaders and shadow maps have room for, the fragment shader's fallback path has one case per light
+MAX_LIGHTS = 4
+#light cubemaps redrawn per frame, the rest keep the shadows they last drew
+SHADOW_UPDATES_PER_FRAME = 2
+#how much of a light's recent motion carries over to the next frame when scheduling shadow updates
+SHADOW_MOTION_DECAY = 0.9
+#cube face size every light starts with
+SHADOW_RESOLUTION = 100
+#face sizes the adaptive policy picks between, smallest to largest
+SHADOW_RESOLUTIONS = (64, 128, 256, 512, 1024)
+#seconds a frame may take before the policy lowers the largest size it hands out
+SHADOW_FRAME_BUDGET = 1 / 60
+#diffuse falloff below which a light is treated as out of reach when measuring its size on screen
+SHADOW_LIGHT_CUTOFF = 0.05
+#frames the policy waits between changes, each change reallocates the shadow maps
+SHADOW_POLICY_COOLDOWN = 30
+
+#edge of the cube the scene's loose octree covers, centered on the origin, and how many times it splits
+SPATIAL_INDEX_SIZE = 1024.0
+SPATIAL_INDEX_DEPTH = 10
+OCTREE_CHILDREN = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.int64)
+
+#render passes the gpu profiler times, in the order render draws them
+GPU_PROFILER_PASSES = ("shadow", "main", "translucent")
+#frames of timestamp queries in flight, results are read back up to this many frames late
+GPU_PROFILER_LATENCY = 4
+#frames the rolling averages span
+GPU_PROFILER_WINDOW = 60
+
+#events a trace keeps before it stops recording, about 100 bytes each
+TRACE_MAX_EVENTS = 1000000
+#frame time histogram bucket edges in milliseconds, the last bucket holds everything slower
+TRACE_HISTOGRAM_EDGES = (0, 4, 8, 16.7, 33.3, 50, 100, 250)
+
+#std140 layout of one PointLight in the FrameData block
+POINT_LIGHT = np.dtype([
+    ("position", "<f4", 3),
+    ("padding", "<f4"),
+    ("color", "<f4", 3),
+    ("strength", "<f4")
+])
+#std140 layout of the FrameData uniform block: camera, projection and lights, shared by both scene programs
+FRAME_DATA_BLOCK = np.dtype([
+    ("view", "<f4", (4, 4)),
+    ("projection", "<f4", (4, 4)),
+    ("cameraPosition", "<f4", 3),
+    ("farPlane", "<f4"),
+    ("lightCount", "<i4"),
+    ("padding", "<i4", 3),
+    ("lights", POINT_LIGHT, MAX_LIGHTS)
+])
+#std140 layout of the ShadowData uniform block: one light's cube face matrices, read by the shadow program
+SHADOW_DATA_BLOCK = np.dtype([
+    ("shadowMatrices", "<f4", (6, 4, 4)),
+    ("lightPosition", "<f4", 3),
+    ("farPlane", "<f4")
+])
+FRAME_DATA_BINDING = 0
+SHADOW_DATA_BINDING = 1
+
+#look direction and up vector of each cubemap face, in GL_TEXTURE_CUBE_MAP_POSITIVE_X + i order
+CUBE_FACE_DIRECTIONS = np.array([
+    [[ 1.0, 0.0, 0.0], [0.0,-1.0, 0.0]],
+    [[-1.0, 0.0, 0.0], [0.0,-1.0, 0.0]],
+    [[ 0.0, 1.0, 0.0], [0.0, 0.0, 1.0]],
+    [[ 0.0,-1.0, 0.0], [0.0, 0.0,-1.0]],
+    [[ 0.0, 0.0, 1.0], [0.0,-1.0, 0.0]],
+    [[ 0.0, 0.0,-1.0], [0.0,-1.0, 0.0]]
+], dtype = np.float32)
+
+#per-instance vertex attributes, locations 3-6 and 7-10 of every mesh's vao
+INSTANCE_DATA = np.dtype([
+    ("model", "<f4", (4, 4)),
+    ("modelViewProjection", "<f4", (4, 4))
+])
+
+#glUniform* call for each uniform type a ShaderProgram can set
+UNIFORM_SETTERS = {
+    GL_FLOAT: lambda location, value: glUniform1f(location, value),
+    GL_FLOAT_VEC2: lambda location, value: glUniform2fv(location, 1, value),
+    GL_FLOAT_VEC3: lambda location, value: glUniform3fv(location, 1, value),
+    GL_FLOAT_VEC4: lambda location, value: glUniform4fv(location, 1, value),
+    GL_INT: lambda location, value: glUniform1i(location, value),
+    GL_UNSIGNED_INT: lambda location, value: glUniform1ui(location, value),
+    GL_BOOL: lambda location, value: glUniform1i(location, value),
+    GL_SAMPLER_2D: lambda location, value: glUniform1i(location, value),
+    GL_SAMPLER_CUBE: lambda location, value: glUniform1i(location, value),
+    GL_SAMPLER_CUBE_MAP_ARRAY: lambda location, value: glUniform1i(location, value),
+    GL_FLOAT_MAT3: lambda location, value: glUniformMatrix3fv(location, 1, GL_FALSE, value),
+    GL_FLOAT_MAT4: lambda location, value: glUniformMatrix4fv(location, 1, GL_FALSE, value)
+}
+
+#obj files are streamed in blocks of this many bytes
+OBJ_CHUNK_SIZE = 512 * 1024
+
+#decoded rgba base level and mip chain, written next to each image the first time it is decoded
+TEXTURE_CACHE_EXTENSION = ".texcache"
+TEXTURE_CACHE_VERSION = 2
+TEXTURE_CACHE_HEADER = np.dtype([
+    ("magic", "S4"),
+    ("version", "<u4"),
+    ("sourceSize", "<u8"),
+    ("sourceMtime", "<i8"),
+    ("sourceHash", "S32"),
+    ("width", "<u4"),
+    ("height", "<u4"),
+    ("format", "S4")
+])
+
+#None: uncompressed RGBA, "BC1": 4 bits per texel, no alpha, "BC3": 8 bits per texel with alpha,
+#"auto": BC1 unless the image uses its alpha channel. Falls back to RGBA without S3TC support.
+TEXTURE_COMPRESSION = None
+BC1_BLOCK = np.dtype([("color0", "<u2"), ("color1", "<u2"), ("colorBits", "<u4")])
+BC3_BLOCK = np.dtype([
+    ("alpha0", "u1"), ("alpha1", "u1"), ("alphaBits", "u1", (6,)),
+    ("color0", "<u2"), ("color1", "<u2"), ("colorBits", "<u4")
+])
 
 ############################## helper functions ###############################
 
@@ -30,23 +305,812 @@ def initialize_glfw():
     glfw.window_hint(GLFW_CONSTANTS.GLFW_CONTEXT_VERSION_MINOR,3)
     glfw.window_hint(GLFW_CONSTANTS.GLFW_OPENGL_PROFILE, GLFW_CONSTANTS.GLFW_OPENGL_CORE_PROFILE)
     glfw.window_hint(GLFW_CONSTANTS.GLFW_OPENGL_FORWARD_COMPAT, GLFW_CONSTANTS.GLFW_TRUE)
-    #for uncapped framerate
-    glfw.window_hint(GLFW_CONSTANTS.GLFW_DOUBLEBUFFER,GL_FALSE) 
+    #debug contexts report everything the driver notices, production ones may skip the checks
+    glfw.window_hint(GLFW_CONSTANTS.GLFW_OPENGL_DEBUG_CONTEXT, GAME_MODE == 0)
     window = glfw.create_window(SCREEN_WIDTH, SCREEN_HEIGHT, "Title", None, None)
     glfw.make_context_current(window)
+    #without vsync swaps return at once, the FrameClock caps the framerate when asked to
+    glfw.swap_interval(1 if VSYNC else 0)
 
     return window
 
+def initialize_egl():
+
+    #EGL is only loaded for headless runs, where there is no display for glfw to open a window on
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not display or not EGL.eglInitialize(display, None, None):
+        raise RuntimeError("could not initialize an EGL display")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+
+    #no config and no surface (EGL_KHR_no_config_context, EGL_KHR_surfaceless_context), frames go to an fbo
+    attributes = (EGL.EGLint * 9)(
+        EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+        EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+        EGL.EGL_CONTEXT_OPENGL_DEBUG, int(GAME_MODE == 0), EGL.EGL_NONE
+    )
+    context = EGL.eglCreateContext(display, EGL.EGLConfig(), EGL.EGL_NO_CONTEXT, attributes)
+    if not context or not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context):
+        raise RuntimeError("could not create a surfaceless OpenGL 3.3 context")
+    return display, context
+
+def command_line_arguments():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--headless", action = "store_true", help = "render offscreen through EGL, no window")
+    parser.add_argument("--frames", type = int, help = "frames to render")
+    parser.add_argument("--camera", help = "json list of {position, theta, phi}, one entry per frame")
+    parser.add_argument("--output", help = "directory to write frame_0000.png, frame_0001.png, ... into")
+    parser.add_argument("--benchmark", action = "store_true", help = "run the benchmark scenarios headless")
+    parser.add_argument("--results", help = "file to write the benchmark json into, printed when not given")
+    parser.add_argument("--baseline", help = "benchmark json to compare against, written when it does not exist")
+    parser.add_argument("--update-baseline", action = "store_true", help = "overwrite the baseline with this run")
+    parser.add_argument("--threshold", type = float, default = BENCHMARK_THRESHOLD, 
+                        help = "share a result may be slower than the baseline")
+    parser.add_argument("--fps-cap", type = float, default = FRAME_CAP, help = "frames per second the window is held to")
+    parser.add_argument("--trace", help = "file to write a chrome trace (chrome://tracing, ui.perfetto.dev) into on exit")
+    return parser.parse_args()
+
+def interpolate_keyframes(keys, t):
+
+    #keys spread evenly over t in [0, 1], numbers and lists of numbers are blended linearly
+    if len(keys) == 1:
+        return keys[0]
+    position = t * (len(keys) - 1)
+    i = min(int(position), len(keys) - 2)
+    blend = position - i
+    first, second = keys[i], keys[i + 1]
+    if isinstance(first, dict):
+        return {name: (1 - blend) * np.asarray(first[name]) + blend * np.asarray(second[name]) for name in first}
+    return (1 - blend) * np.asarray(first) + blend * np.asarray(second)
+
+def summarize_times(times):
+
+    #seconds in, milliseconds out
+    milliseconds = 1000 * np.asarray(times)
+    return {
+        "mean": float(milliseconds.mean()),
+        "p50": float(np.percentile(milliseconds, 50)),
+        "p95": float(np.percentile(milliseconds, 95)),
+        "p99": float(np.percentile(milliseconds, 99)),
+        "max": float(milliseconds.max()),
+    }
+
+def compare_benchmark(results, baseline, threshold):
+
+    #one line per result slower than the baseline allows, empty when the run passes
+    regressions = []
+    for startup in ("startup_cold", "startup_warm"):
+        if startup not in baseline:
+            continue
+        milliseconds, expected = 1000 * results[startup], 1000 * baseline[startup]
+        if milliseconds > max(expected * (1 + threshold), expected + BENCHMARK_NOISE_FLOOR):
+            regressions.append(f"{startup}: {milliseconds:.1f} ms, baseline {expected:.1f} ms")
+    for name, scenario in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        for stage, times in scenario.items():
+            expected = baseline["scenarios"][name].get(stage)
+            if expected is None:
+                continue
+            for percentile in BENCHMARK_CHECKED:
+                allowed = max(expected[percentile] * (1 + threshold), expected[percentile] + BENCHMARK_NOISE_FLOOR)
+                if times[percentile] > allowed:
+                    regressions.append(f"{name} {stage} {percentile}: {times[percentile]:.2f} ms, "
+                                       f"baseline {expected[percentile]:.2f} ms")
+    return regressions
+
+def clear_asset_caches(directories = BENCHMARK_CACHE_DIRECTORIES):
+
+    #the next load of every asset in these directories parses or decodes its source again
+    for directory in directories:
+        for name in os.listdir(directory):
+            if name.endswith((MESH_CACHE_EXTENSION, TEXTURE_CACHE_EXTENSION)):
+                os.remove(os.path.join(directory, name))
+
+#every cache header starts with magic, version, sourceSize, sourceMtime and sourceHash
+
+def hash_file(filename):
+
+    #hashed block by block so the source never has to fit in memory
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.digest()
+
+def read_cache_header(cachePath, headerType, magic, version):
+
+    try:
+        with open(cachePath, "rb") as f:
+            header = np.fromfile(f, dtype=headerType, count=1)
+    except OSError:
+        return None
+    if len(header) == 0:
+        return None
+    header = header[0]
+    if header["magic"] != magic or header["version"] != version:
+        return None
+    return header
+
+def cache_is_fresh(header, cachePath, expectedSize, filename, sourceStat):
+
+    #a truncated or partially written cache is never trusted
+    if os.path.getsize(cachePath) != expectedSize:
+        return False
+    if header["sourceSize"] != sourceStat.st_size:
+        return False
+    if header["sourceMtime"] == sourceStat.st_mtime_ns:
+        return True
+    #touched but possibly unchanged, fall back to comparing contents
+    if header["sourceHash"] != hash_file(filename):
+        return False
+    #same contents, remember the new mtime so later runs skip the hash
+    header["sourceMtime"] = sourceStat.st_mtime_ns
+    try:
+        with open(cachePath, "r+b") as f:
+            f.write(header.tobytes())
+    except OSError:
+        pass
+    return True
+
+def create_cache_header(headerType, magic, version, filename, sourceStat):
+
+    header = np.zeros(1, dtype=headerType)
+    header["magic"] = magic
+    header["version"] = version
+    header["sourceSize"] = sourceStat.st_size
+    header["sourceMtime"] = sourceStat.st_mtime_ns
+    header["sourceHash"] = hash_file(filename)
+    return header
+
+def write_cache(cachePath, arrays):
+
+    #write beside the final path and swap it in, so readers never see half a file
+    temporaryPath = cachePath + ".tmp"
+    try:
+        with open(temporaryPath, "wb") as f:
+            for array in arrays:
+                array.tofile(f)
+        os.replace(temporaryPath, cachePath)
+    except OSError as e:
+        print(f"could not write cache {cachePath}: {e}")
+
+def map_cache(cachePath, dtype, offset, count):
+
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(cachePath, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+def read_shader(filepath, defines):
+
+    with open(filepath,'r') as f:
+        lines = f.readlines()
+    #defines go straight after the #version line
+    return lines[:1] + [f"#define {define}\n" for define in defines] + lines[1:]
+
+def has_gl_extension(name):
+
+    count = glGetIntegerv(GL_NUM_EXTENSIONS)
+    return any(glGetStringi(GL_EXTENSIONS, i).decode() == name for i in range(count))
+
+def query_timestamp(query):
+
+    #PyOpenGL's wrapper has no array type for GLuint64 results, the raw entry point fills a ctypes integer
+    result = ctypes.c_uint64()
+    glGetQueryObjectui64vRaw(int(query), GL_QUERY_RESULT, ctypes.byref(result))
+    return result.value
+
+def compressed_size(textureFormat, width, height):
+
+    blocks = ((width + 3) // 4) * ((height + 3) // 4)
+    if textureFormat == "BC1":
+        return blocks * BC1_BLOCK.itemsize
+    if textureFormat == "BC3":
+        return blocks * BC3_BLOCK.itemsize
+    return 4 * width * height
+
+def split_blocks(rgba, width, height):
+
+    #(blocks, 16 texels, 4 channels), blocks and texels both in row order.
+    #partial blocks at the right and bottom edges repeat the last row/column
+    image = rgba.reshape(height, width, 4)
+    paddedHeight = (height + 3) // 4 * 4
+    paddedWidth = (width + 3) // 4 * 4
+    image = np.pad(image, ((0, paddedHeight - height), (0, paddedWidth - width), (0, 0)), mode="edge")
+    return image.reshape(paddedHeight // 4, 4, paddedWidth // 4, 4, 4) \
+        .transpose(0, 2, 1, 3, 4).reshape(-1, 16, 4)
+
+def encode_color_blocks(colors):
+
+    #endpoints are the extremes of each block along its principal axis
+    colors = colors.astype(np.float32)
+    mean = colors.mean(axis=1)
+    centered = colors - mean[:,None,:]
+    covariance = np.einsum("npi,npj->nij", centered, centered)
+    axis = colors.max(axis=1) - colors.min(axis=1) + 1e-3
+    for _ in range(4):
+        axis = np.einsum("nij,nj->ni", covariance, axis)
+        axis /= np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-6)
+    projection = np.einsum("npi,ni->np", centered, axis)
+    high = np.clip(mean + axis * projection.max(axis=1, keepdims=True), 0, 255)
+    low = np.clip(mean + axis * projection.min(axis=1, keepdims=True), 0, 255)
+
+    #quantize to 5:6:5, keeping color0 >= color1 so the block decodes with 4 colors
+    def pack565(color):
+        rgb = np.rint(color * (np.array([31, 63, 31]) / 255.0)).astype(np.uint16)
+        return (rgb[:,0] << 11) | (rgb[:,1] << 5) | rgb[:,2]
+    color0 = pack565(high)
+    color1 = pack565(low)
+    swap = color0 < color1
+    color0[swap], color1[swap] = color1[swap], color0[swap]
+
+    def unpack565(color):
+        r = (color >> 11) & 31
+        g = (color >> 5) & 63
+        b = color & 31
+        return np.stack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)), axis=1) \
+            .astype(np.float32)
+    end0 = unpack565(color0)
+    end1 = unpack565(color1)
+    palette = np.stack((end0, end1, (2 * end0 + end1) / 3, (end0 + 2 * end1) / 3), axis=1)
+
+    #nearest palette entry per texel, two bits each with texel 0 in the lowest bits
+    distance = ((colors[:,:,None,:] - palette[:,None,:,:]) ** 2).sum(axis=3)
+    codes = distance.argmin(axis=2).astype(np.uint32)
+    bits = (codes << (2 * np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+    return color0, color1, bits
+
+def encode_alpha_blocks(alpha):
+
+    #8 interpolated values between the block's largest and smallest alpha
+    alpha = alpha.astype(np.float32)
+    alpha0 = alpha.max(axis=1)
+    alpha1 = alpha.min(axis=1)
+    weights = np.array([0, 7, 1, 2, 3, 4, 5, 6], dtype=np.float32) / 7
+    palette = np.floor(alpha0[:,None] * (1 - weights) + alpha1[:,None] * weights + 0.5)
+    codes = np.abs(alpha[:,:,None] - palette[:,None,:]).argmin(axis=2).astype(np.uint64)
+    #flat blocks decode every code to alpha0
+    codes[alpha0 == alpha1] = 0
+    #48 bits of 3 bit codes, little endian
+    bits = (codes << (3 * np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+    bytes6 = ((bits[:,None] >> (8 * np.arange(6, dtype=np.uint64))) & 255).astype(np.uint8)
+    return alpha0.astype(np.uint8), alpha1.astype(np.uint8), bytes6
+
+def compress_texture(rgba, width, height, textureFormat):
+
+    blocks = split_blocks(rgba, width, height)
+    if textureFormat == "BC1":
+        encoded = np.empty(len(blocks), dtype=BC1_BLOCK)
+    else:
+        encoded = np.empty(len(blocks), dtype=BC3_BLOCK)
+        encoded["alpha0"], encoded["alpha1"], encoded["alphaBits"] = encode_alpha_blocks(blocks[:,:,3])
+    encoded["color0"], encoded["color1"], encoded["colorBits"] = encode_color_blocks(blocks[:,:,0:3])
+    return encoded.view(np.uint8)
+
+def compose_model_matrices(positions, eulers):
+
+    #vectorized pyrr.matrix44.create_from_eulers(radians(eulers)) times create_from_translation(position)
+    roll, pitch, yaw = np.radians(eulers).T
+    sP, cP = np.sin(pitch), np.cos(pitch)
+    sR, cR = np.sin(roll), np.cos(roll)
+    sY, cY = np.sin(yaw), np.cos(yaw)
+
+    models = np.zeros((len(positions), 4, 4), dtype=np.float32)
+    models[:,0,0] = cY * cP
+    models[:,0,1] = -cY * sP * cR + sY * sR
+    models[:,0,2] = cY * sP * sR + sY * cR
+    models[:,1,0] = sP
+    models[:,1,1] = cP * cR
+    models[:,1,2] = -cP * sR
+    models[:,2,0] = -sY * cP
+    models[:,2,1] = sY * sP * cR + cY * sR
+    models[:,2,2] = -sY * sP * sR + cY * cR
+    models[:,3,0:3] = positions
+    models[:,3,3] = 1
+    return models
+
+def edge_keys(triangles, vertexCount):
+
+    #every face's three edges as lo * vertexCount + hi, one int64 per edge instead of a row to sort
+    first = triangles.astype(np.int64)
+    second = np.roll(first, -1, axis = 1)
+    return (np.minimum(first, second) * vertexCount + np.maximum(first, second)).ravel()
+
+def unique_triangles(triangles):
+
+    #first copy of every face, whichever corner its winding starts at, in the original order
+    corners = np.sort(triangles, axis = 1)
+    order = np.lexsort((corners[:, 2], corners[:, 1], corners[:, 0]))
+    corners = corners[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (corners[1:] != corners[:-1]).any(axis = 1)
+    return triangles[np.sort(order[first])]
+
+def edge_collapse_round(positions, triangles, quadrics, locked, collapses):
+
+    #one batch of vertex-disjoint half-edge collapses, cheapest first, returns the new triangles and the worst cost taken
+    vertexCount = len(positions)
+    edges = np.unique(edge_keys(triangles, vertexCount))
+    low, high = edges // vertexCount, edges % vertexCount
+    sources = np.concatenate((low, high))
+    targets = np.concatenate((high, low))
+    del edges, low, high
+    movable = ~locked[sources]
+    sources, targets = sources[movable], targets[movable]
+    if len(sources) == 0:
+        return triangles, None
+
+    #cost of moving the source onto the target, against every plane either of them carries
+    #quadrics are stored as float32, the costs are small differences of large terms so they are summed in float64
+    points = np.c_[positions[targets], np.ones(len(targets))]
+    costs = np.einsum("ni,nij,nj->n", points, quadrics[sources] + quadrics[targets].astype(np.float64), points)
+    del points
+    ranks = np.empty(len(costs), dtype=np.int64)
+    ranks[np.argsort(costs, kind = "stable")] = np.arange(len(costs))
+
+    #a collapse is taken only when it is the cheapest touching both of its vertices, so no vertex is in two
+    cheapest = np.full(vertexCount, len(costs), dtype=np.int64)
+    np.minimum.at(cheapest, sources, ranks)
+    np.minimum.at(cheapest, targets, ranks)
+    chosen = np.flatnonzero((ranks == cheapest[sources]) & (ranks == cheapest[targets]))
+    chosen = chosen[np.argsort(ranks[chosen])][:collapses]
+
+    normals = np.cross(positions[triangles[:, 1]] - positions[triangles[:, 0]], 
+                       positions[triangles[:, 2]] - positions[triangles[:, 0]])
+    while len(chosen) > 0:
+        remap = np.arange(vertexCount, dtype=triangles.dtype)
+        remap[sources[chosen]] = targets[chosen]
+        collapsed = remap[triangles]
+        degenerate = (collapsed[:, 0] == collapsed[:, 1]) | (collapsed[:, 1] == collapsed[:, 2]) \
+            | (collapsed[:, 2] == collapsed[:, 0])
+        moved = (collapsed != triangles).any(axis = 1) & ~degenerate
+        newNormals = np.cross(positions[collapsed[moved, 1]] - positions[collapsed[moved, 0]], 
+                              positions[collapsed[moved, 2]] - positions[collapsed[moved, 0]])
+        flipped = (newNormals * normals[moved]).sum(axis = 1) <= 0
+        if not flipped.any():
+            break
+        #collapses that would fold a face over are dropped and the rest tried again
+        chosen = chosen[~np.isin(sources[chosen], triangles[moved][flipped])]
+    if len(chosen) == 0:
+        return triangles, None
+
+    #chosen collapses share no vertex, so every target is added to once
+    quadrics[targets[chosen]] += quadrics[sources[chosen]]
+    #faces that became copies of one another are kept once
+    return unique_triangles(collapsed[~degenerate]), float(costs[chosen].max())
+
+def build_lods(vertices, indices, reduction = LOD_REDUCTION, levels = LOD_LEVELS, maxTriangles = LOD_MAX_TRIANGLES):
+
+    #quadric error edge collapse, every level only drops and re-points triangles so all share the vertex buffer
+    if len(indices) > 3 * maxTriangles:
+        return [(np.asarray(indices).reshape(-1, 3), 0.0)]
+    triangles = np.asarray(indices).reshape(-1, 3).astype(np.int32)
+    #float32 quadrics lose their precision far from the origin, so the mesh is simplified centered at unit size
+    positions = vertices.reshape(-1, 8)[:, 0:3]
+    low, high = positions.min(axis = 0), positions.max(axis = 0)
+    scale = max(float((high - low).max()) / 2, 1e-12)
+    positions = ((positions - (low + high) / 2) / scale).astype(np.float32)
+    vertexCount = len(positions)
+
+    #open edges and corners shared with other vertices (uv or normal seams) never move, so nothing cracks
+    edges, uses = np.unique(edge_keys(triangles, vertexCount), return_counts = True)
+    open = edges[uses == 1]
+    locked = np.zeros(vertexCount, dtype=bool)
+    locked[open // vertexCount] = True
+    locked[open % vertexCount] = True
+    del edges, uses, open
+    order = np.lexsort((positions[:, 2], positions[:, 1], positions[:, 0]))
+    same = (positions[order[1:]] == positions[order[:-1]]).all(axis = 1)
+    locked[order[1:][same]] = True
+    locked[order[:-1][same]] = True
+
+    #each vertex starts with the planes of the faces around it
+    normals = np.cross(positions[triangles[:, 1]] - positions[triangles[:, 0]], 
+                       positions[triangles[:, 2]] - positions[triangles[:, 0]])
+    lengths = np.linalg.norm(normals, axis = 1)
+    normals /= np.maximum(lengths, 1e-12)[:, None]
+    planes = np.c_[normals, -(normals * positions[triangles[:, 0]]).sum(axis = 1)]
+    planes[lengths < 1e-12] = 0
+    del normals, lengths
+    quadrics = np.zeros((vertexCount, 16), dtype=np.float32)
+    for row in range(4):
+        for column in range(4):
+            weights = planes[:, row] * planes[:, column]
+            for corner in range(3):
+                quadrics[:, 4 * row + column] += np.bincount(triangles[:, corner], weights, vertexCount)
+    quadrics = quadrics.reshape(-1, 4, 4)
+    del planes
+
+    lods = [(triangles, 0.0)]
+    error = 0.0
+    for level in range(levels):
+        target = int(len(lods[-1][0]) * reduction)
+        current = lods[-1][0]
+        while len(current) > target:
+            current, cost = edge_collapse_round(positions, current, quadrics, locked, 
+                                                max(1, (len(current) - target) // 2))
+            if cost is None:
+                break
+            error = max(error, scale * math.sqrt(max(cost, 0.0)))
+        #a level that barely simplified is not worth a draw of its own
+        if len(current) > len(lods[-1][0]) * (1 + reduction) / 2:
+            break
+        lods.append((current, error))
+    return lods
+
+def submesh_vertex_starts(indices, submeshes):
+
+    #every submesh owns a contiguous run of vertices, so a triangle's first corner tells which one it came from
+    return np.array([indices[s.first_index:s.first_index + s.index_count].min() for s in submeshes], dtype=np.int64)
+
+def frustum_planes(matrices):
+
+    #planes of row-vector view-projection matrices, normals point inwards and are unit length
+    columns = np.swapaxes(matrices, -1, -2)
+    planes = np.stack([
+        columns[..., 3, :] + columns[..., 0, :], columns[..., 3, :] - columns[..., 0, :],
+        columns[..., 3, :] + columns[..., 1, :], columns[..., 3, :] - columns[..., 1, :],
+        columns[..., 3, :] + columns[..., 2, :], columns[..., 3, :] - columns[..., 2, :]
+    ], axis = -2)
+    return planes / np.linalg.norm(planes[..., :3], axis = -1, keepdims = True)
+
+def frustum_cull(planes, models, centers, extents, radii):
+
+    #world centers of model-space bounds, the model matrices carry no scale
+    rotations = models[:, :3, :3]
+    worldCenters = np.einsum("nj,nji->ni", centers, rotations) + models[:, 3, :3]
+    distances = worldCenters @ planes[:, :3].T + planes[:, 3]
+
+    #spheres first, the rotated boxes only where a sphere straddles a plane
+    visible = (distances >= -radii[:, None]).all(axis = 1)
+    straddling = visible & (distances < radii[:, None]).any(axis = 1)
+    if straddling.any():
+        reach = np.abs(np.einsum("nij,pj->npi", rotations[straddling], planes[:, :3]))
+        reach = (reach * extents[straddling][:, None, :]).sum(axis = 2)
+        visible[straddling] = (distances[straddling] >= -reach).all(axis = 1)
+    return visible
+
+def light_reach(light):
+
+    #distance past which the light's diffuse falloff drops under SHADOW_LIGHT_CUTOFF
+    return math.sqrt(light.strength / SHADOW_LIGHT_CUTOFF)
+
+def ray_slabs(origins, directions, low, high):
+
+    #entry and exit distances of rays through axis aligned boxes, the ray misses where entry > exit
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        inverse = 1 / directions
+        near = (low - origins) * inverse
+        far = (high - origins) * inverse
+    entry = np.fmax.reduce(np.fmin(near, far), axis = -1)
+    leave = np.fmin.reduce(np.fmax(near, far), axis = -1)
+    return entry, leave
+
+def sphere_face_mask(centers, radius, facePlanes):
+
+    #bit per cube face whose frustum any of the spheres reaches
+    distances = np.einsum("nj,fpj->nfp", centers, facePlanes[..., :3]) + facePlanes[..., 3]
+    touched = (distances >= -radius).all(axis = 2).any(axis = 0)
+    return int(np.dot(touched, 1 << np.arange(len(touched))))
+
 ###############################################################################
 
 
 class SimpleComponent:
 
 
-    def __init__(self, position, eulers):
+    def __init__(self, transforms, position, eulers, static = True):
 
-        self.position = np.array(position, dtype=np.float32)
-        self.eulers = np.array(eulers, dtype=np.float32)
+        #position, eulers and whether the object is static are rows of the scene's transform store,
+        #static objects cast their shadows from a cubemap that is only rebuilt when they or the light move
+        self.transforms = transforms
+        self.index = transforms.add(position, eulers, static)
+
+    @property
+    def static(self):
+        return bool(self.transforms.static[self.index])
+
+    @static.setter
+    def static(self, value):
+        self.transforms.set_static(self.index, value)
+
+    @property
+    def position(self):
+        return self.transforms.positions[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.transforms.positions[self.index] = value
+
+    @property
+    def eulers(self):
+        return self.transforms.eulers[self.index]
+
+    @eulers.setter
+    def eulers(self, value):
+        self.transforms.eulers[self.index] = value
+
+class TransformStore:
+
+
+    def __init__(self, capacity = 16):
+
+        #one row per component, contiguous so every matrix is built in a single vectorized call
+        self.count = 0
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.eulers = np.zeros((capacity, 3), dtype=np.float32)
+        self.models = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.modelViewProjections = np.zeros((capacity, 4, 4), dtype=np.float32)
+
+        #transforms the model matrices were last built from, rows that differ are dirty
+        self.builtPositions = np.full((capacity, 3), np.nan, dtype=np.float32)
+        self.builtEulers = np.full((capacity, 3), np.nan, dtype=np.float32)
+        self.viewProjection = None
+        self.modelsBuilt = 0
+
+        #rows drawn into the baked static shadows, the version goes up whenever one of them moves or a row
+        #changes sides, so a bake is stale exactly when the version it was made at is
+        self.static = np.ones(capacity, dtype=bool)
+        self.staticVersion = 0
+
+        #how far the last simulation step moved each row, drawn set back by 1 - alpha so moving
+        #objects glide between steps, moves made outside a step show at once
+        self.positionMotion = np.zeros((capacity, 3), dtype=np.float32)
+        self.eulerMotion = np.zeros((capacity, 3), dtype=np.float32)
+        self.stepStart = None
+        self.moving = False
+        self.alpha = 1.0
+
+    def add(self, position, eulers, static = True):
+
+        if self.count == len(self.positions):
+            self.grow()
+        index = self.count
+        self.positions[index] = position
+        self.eulers[index] = eulers
+        self.static[index] = static
+        self.count += 1
+        return index
+
+    def set_static(self, index, static):
+
+        if self.static[index] != static:
+            self.static[index] = static
+            self.staticVersion += 1
+
+    def grow(self):
+
+        capacity = 2 * len(self.positions)
+        for name in ("positions", "eulers", "models", "modelViewProjections", "builtPositions", "builtEulers", 
+                     "positionMotion", "eulerMotion", "static"):
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], np.nan if name.startswith("built") else 0, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def begin_step(self):
+
+        self.stepStart = (self.positions[:self.count].copy(), self.eulers[:self.count].copy())
+
+    def end_step(self):
+
+        #rows added during the step did not move
+        positions, eulers = self.stepStart
+        count = len(positions)
+        self.positionMotion[:count] = self.positions[:count] - positions
+        self.eulerMotion[:count] = (self.eulers[:count] - eulers + 180) % 360 - 180
+        self.positionMotion[count:self.count] = 0
+        self.eulerMotion[count:self.count] = 0
+        self.moving = bool(self.positionMotion.any() or self.eulerMotion.any())
+
+    def update(self, viewProjection):
+
+        #returns the rows whose model matrix was rebuilt
+        count = self.count
+        positions = self.positions[:count]
+        eulers = self.eulers[:count]
+        if self.moving and self.alpha < 1:
+            lag = 1 - self.alpha
+            positions = positions - lag * self.positionMotion[:count]
+            eulers = eulers - lag * self.eulerMotion[:count]
+        dirty = np.flatnonzero(
+            np.any(positions != self.builtPositions[:count], axis=1)
+            | np.any(eulers != self.builtEulers[:count], axis=1)
+        )
+        self.modelsBuilt = len(dirty)
+        if len(dirty) > 0:
+            self.models[dirty] = compose_model_matrices(positions[dirty], eulers[dirty])
+            self.builtPositions[dirty] = positions[dirty]
+            self.builtEulers[dirty] = eulers[dirty]
+            if self.static[dirty].any():
+                self.staticVersion += 1
+
+        #a camera change touches every product, otherwise only moved objects need a new one
+        if self.viewProjection is None or not np.array_equal(viewProjection, self.viewProjection):
+            self.viewProjection = viewProjection.copy()
+            np.matmul(self.models[:count], viewProjection, out = self.modelViewProjections[:count])
+        elif len(dirty) > 0:
+            self.modelViewProjections[dirty] = np.matmul(self.models[dirty], viewProjection)
+        return dirty
+
+class SpatialIndex:
+
+
+    def __init__(self, transforms, size = SPATIAL_INDEX_SIZE, depth = SPATIAL_INDEX_DEPTH):
+
+        #loose octree over the world bounding spheres of transform store rows, cells are hashed per level
+        #and reach half a cell past their edges, so a moving object only changes cells now and then
+        self.transforms = transforms
+        self.size = size
+        self.depth = depth
+        self.origin = np.full(3, -size / 2, dtype=np.float32)
+        #rows stored in each cell, and rows stored in each cell or anywhere below it
+        self.cells = [{} for level in range(depth + 1)]
+        self.counts = [{} for level in range(depth + 1)]
+        #rows too big or too far out for the tree, every query tests them
+        self.outside = set()
+
+        #model-space sphere, world sphere and cell of every row, level -1 is not indexed yet and -2 outside
+        self.localCenters = np.zeros((0, 3), dtype=np.float32)
+        self.localRadii = np.zeros(0, dtype=np.float32)
+        self.centers = np.zeros((0, 3), dtype=np.float32)
+        self.radii = np.zeros(0, dtype=np.float32)
+        self.levels = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.int64)
+
+    def ensure(self, count):
+
+        capacity = len(self.radii)
+        if count <= capacity:
+            return
+        capacity = max(count, 2 * capacity, 16)
+        for name, fill in (("localCenters", 0), ("localRadii", 0), ("centers", 0), ("radii", 0), 
+                           ("levels", -1), ("keys", 0)):
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def encode(self, x, y, z):
+
+        return (x << (2 * self.depth)) | (y << self.depth) | z
+
+    def decode(self, key):
+
+        mask = (1 << self.depth) - 1
+        return key >> (2 * self.depth), (key >> self.depth) & mask, key & mask
+
+    def set_bounds(self, rows, center, radius):
+
+        #model-space sphere of the mesh drawn at these rows
+        rows = np.asarray(rows, dtype=np.intp)
+        self.ensure(self.transforms.count)
+        self.localCenters[rows] = center
+        self.localRadii[rows] = radius
+        self.update(rows)
+
+    def update(self, rows):
+
+        rows = np.asarray(rows, dtype=np.intp)
+        self.ensure(self.transforms.count)
+        if len(rows) == 0:
+            return
+        models = self.transforms.models[rows]
+        self.centers[rows] = np.einsum("nj,nji->ni", self.localCenters[rows], models[:, :3, :3]) + models[:, 3, :3]
+        self.radii[rows] = self.localRadii[rows]
+
+        #only rows that left their cell are moved one by one
+        levels, keys = self.place(self.centers[rows], self.radii[rows])
+        moved = (levels != self.levels[rows]) | (keys != self.keys[rows])
+        for row, level, key in zip(rows[moved].tolist(), levels[moved].tolist(), keys[moved].tolist()):
+            self.remove(row)
+            self.insert(row, level, key)
+
+    def place(self, centers, radii):
+
+        #deepest level whose cells are at least as wide as the sphere, outside when the cell falls off the tree
+        with np.errstate(divide = "ignore"):
+            levels = np.minimum(np.floor(np.log2(self.size / (2 * radii))), self.depth)
+        sides = 2 ** np.clip(levels, 0, self.depth).astype(np.int64)
+        cells = np.floor((centers - self.origin) * (sides / self.size)[:, None]).astype(np.int64)
+        outside = (levels < 0) | (cells < 0).any(axis = 1) | (cells >= sides[:, None]).any(axis = 1)
+        cells[outside] = 0
+        return np.where(outside, -2, levels).astype(np.int64), self.encode(*cells.T)
+
+    def insert(self, row, level, key):
+
+        self.levels[row] = level
+        self.keys[row] = key
+        if level == -2:
+            self.outside.add(row)
+            return
+        self.cells[level].setdefault(key, set()).add(row)
+        x, y, z = self.decode(key)
+        for parent in range(level, -1, -1):
+            parentKey = self.encode(x >> (level - parent), y >> (level - parent), z >> (level - parent))
+            self.counts[parent][parentKey] = self.counts[parent].get(parentKey, 0) + 1
+
+    def remove(self, row):
+
+        level, key = int(self.levels[row]), int(self.keys[row])
+        if level == -1:
+            return
+        if level == -2:
+            self.outside.discard(row)
+            return
+        cell = self.cells[level][key]
+        cell.discard(row)
+        if not cell:
+            del self.cells[level][key]
+        x, y, z = self.decode(key)
+        for parent in range(level, -1, -1):
+            parentKey = self.encode(x >> (level - parent), y >> (level - parent), z >> (level - parent))
+            self.counts[parent][parentKey] -= 1
+            if self.counts[parent][parentKey] == 0:
+                del self.counts[parent][parentKey]
+
+    def candidates(self, cellTest):
+
+        #walks the tree a level at a time, cellTest gets the loose bounds of a batch of cells and says which to enter
+        rows = list(self.outside)
+        keys = np.array([0] if self.counts[0] else [], dtype=np.int64)
+        for level in range(self.depth + 1):
+            if len(keys) == 0:
+                break
+            cellSize = self.size / 2 ** level
+            cells = np.stack(self.decode(keys), axis = 1)
+            low = self.origin + (cells - 0.5) * cellSize
+            entered = cellTest(low, low + 2 * cellSize)
+            keys, cells = keys[entered], cells[entered]
+
+            stored = self.cells[level]
+            for key in keys.tolist():
+                rows.extend(stored.get(key, ()))
+            if level < self.depth:
+                counts = self.counts[level + 1]
+                children = (2 * cells[:, None, :] + OCTREE_CHILDREN).reshape(-1, 3)
+                keys = np.array([key for key in self.encode(*children.T).tolist() if key in counts], dtype=np.int64)
+        return np.array(rows, dtype=np.intp)
+
+    def query_frustum(self, planes):
+
+        def cellTest(low, high):
+            centers, extents = (low + high) / 2, (high - low) / 2
+            return (centers @ planes[:, :3].T + planes[:, 3] + extents @ np.abs(planes[:, :3]).T >= 0).all(axis = 1)
+
+        rows = self.candidates(cellTest)
+        distances = self.centers[rows] @ planes[:, :3].T + planes[:, 3]
+        return rows[(distances >= -self.radii[rows][:, None]).all(axis = 1)]
+
+    def query_sphere(self, center, radius):
+
+        def cellTest(low, high):
+            return ((np.clip(center, low, high) - center) ** 2).sum(axis = 1) <= radius * radius
+
+        rows = self.candidates(cellTest)
+        return rows[np.linalg.norm(self.centers[rows] - center, axis = 1) <= radius + self.radii[rows]]
+
+    def query_ray(self, origin, direction, maxDistance = np.inf):
+
+        #rows whose sphere the ray enters within maxDistance, nearest first, with the distance it enters at
+        direction = direction / np.linalg.norm(direction)
+
+        def cellTest(low, high):
+            entry, leave = ray_slabs(origin, direction, low, high)
+            return (entry <= leave) & (leave >= 0) & (entry <= maxDistance)
+
+        rows = self.candidates(cellTest)
+        offsets = self.centers[rows] - origin
+        along = offsets @ direction
+        missed = (offsets ** 2).sum(axis = 1) - along ** 2
+        hit = missed <= self.radii[rows] ** 2
+        halfChord = np.sqrt(np.maximum(self.radii[rows] ** 2 - missed, 0))
+        distances = np.maximum(along - halfChord, 0)
+        hit &= (along + halfChord >= 0) & (distances <= maxDistance)
+        order = np.argsort(distances[hit])
+        return rows[hit][order], distances[hit][order]
 
 class Light:
 
@@ -89,17 +1153,21 @@ class Scene:
 
     def __init__(self):
 
-        self.bulb = SimpleComponent(position = [6, 0, 0],
+        self.transforms = TransformStore()
+        #bounds come from the meshes the renderer draws at each row, moved rows are refreshed as they move
+        self.spatialIndex = SpatialIndex(self.transforms)
+
+        self.bulb = SimpleComponent(self.transforms, position = [6, 0, 0],
                          eulers = [0, 0, 0])
-        self.shade = SimpleComponent(position = [6, 0, 0],
+        self.shade = SimpleComponent(self.transforms, position = [6, 0, 0],
                          eulers = [0, 0, 0])
-        self.base = SimpleComponent(position = [6, 0, 0],
+        self.base = SimpleComponent(self.transforms, position = [6, 0, 0],
                          eulers = [0, 0, 0])
-        self.ground = SimpleComponent(position = [0, 0, -2],
+        self.ground = SimpleComponent(self.transforms, position = [0, 0, -2],
                          eulers = [0, 0, 0])
         
-        self.moveable_object = SimpleComponent(position = [2, 0, -1],
-                                               eulers = [0, 0, 0])
+        self.moveable_object = SimpleComponent(self.transforms, position = [2, 0, -1],
+                                               eulers = [0, 0, 0], static = False)
 
         self.lights = [Light(
             position = [6, 0, 4.6], 
@@ -114,6 +1182,15 @@ class Scene:
     def update(self, rate):
         pass
 
+    def simulate(self, steps, alpha):
+
+        #fixed steps of SIMULATION_STEP seconds, alpha is how far the frame has got into the next one
+        for _ in range(steps):
+            self.transforms.begin_step()
+            self.update(1000 * SIMULATION_STEP / 16.67)
+            self.transforms.end_step()
+        self.transforms.alpha = alpha
+
     def move_object(self, dPos):
         dPos = np.array(dPos, dtype = np.float32)
         self.moveable_object.position += dPos
@@ -139,11 +1216,12 @@ class Scene:
 class App:
 
 
-    def __init__(self, window):
+    def __init__(self, window, tracer = None, frameCap = FRAME_CAP):
 
         self.window = window
+        self.tracer = tracer or Tracer()
 
-        self.renderer = GraphicsEngine()
+        self.renderer = GraphicsEngine(self.tracer)
 
         self.scene = Scene()
 
@@ -153,29 +1231,50 @@ class App:
         self.frameTime = 0
 
         glfw.set_input_mode(self.window, GLFW_CONSTANTS.GLFW_CURSOR, GLFW_CONSTANTS.GLFW_CURSOR_HIDDEN)
+        #a left click picks the object under the crosshair, once per press
+        self.mouseHeld = False
+        self.picked = None
 
+        #started last, so loading is not counted as the first frame
+        self.clock = FrameClock(frameCap = frameCap)
         self.mainLoop()
 
     def mainLoop(self):
         running = True
+        tracer = self.tracer
         while (running):
+            frameStart = time.perf_counter()
+            #milliseconds since the last frame, for input, the simulation keeps its own fixed steps
+            self.clock.tick()
+            self.frameTime = 1000 * self.clock.delta
             #check events
             if glfw.window_should_close(self.window) \
                 or glfw.get_key(self.window, GLFW_CONSTANTS.GLFW_KEY_ESCAPE) == GLFW_CONSTANTS.GLFW_PRESS:
                 running = False
             
-            self.handleKeys()
-            self.handleArrowKeys()
-            self.handleMouse()
-
-            glfw.poll_events()
-
-            self.scene.update(self.frameTime / 16.67)
+            with tracer.span("handleKeys"):
+                self.handleKeys()
+            with tracer.span("handleArrowKeys"):
+                self.handleArrowKeys()
+            with tracer.span("handleMouse"):
+                self.handleMouse()
+
+            with tracer.span("poll_events"):
+                glfw.poll_events()
+
+            with tracer.span("scene.update"):
+                steps = self.clock.steps()
+                self.scene.simulate(steps, self.clock.alpha)
             
-            self.renderer.render(self.scene)
+            with tracer.span("renderer.render"):
+                self.renderer.render(self.scene)
+            glfw.swap_buffers(self.window)
 
             #timing
             self.calculateFramerate()
+            with tracer.span("frame limit"):
+                self.clock.limit()
+            tracer.frame(frameStart, time.perf_counter())
         self.quit()
 
     def handleKeys(self):
@@ -300,6 +1399,22 @@ class App:
         self.scene.spin_player(theta_increment, phi_increment)
         glfw.set_cursor_pos(self.window, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
 
+        pressed = glfw.get_mouse_button(self.window, GLFW_CONSTANTS.GLFW_MOUSE_BUTTON_LEFT) == GLFW_CONSTANTS.GLFW_PRESS
+        if pressed and not self.mouseHeld:
+            self.pickObject()
+        self.mouseHeld = pressed
+
+    def pickObject(self):
+
+        #the cursor is held at the centre of the screen, which is where pick looks by default
+        self.picked = self.renderer.pick(self.scene)
+        if GAME_MODE == 0:
+            if self.picked is None:
+                print("picked nothing")
+            else:
+                item, component = self.picked
+                print(f"picked {item.name} at {np.round(component.position, 2).tolist()}")
+
     def calculateFramerate(self):
 
         self.currentTime = glfw.get_time()
@@ -309,29 +1424,240 @@ class App:
             glfw.set_window_title(self.window, f"Running at {framerate} fps.")
             self.lastTime = self.currentTime
             self.numFrames = -1
-            self.frameTime = float(1000.0 / max(1,framerate))
         self.numFrames += 1
 
     def quit(self):
         
         self.renderer.destroy()
 
-class GraphicsEngine:
+class HeadlessApp:
 
 
-    def __init__(self):
+    def __init__(self, tracer = None):
+
+        self.display, self.context = initialize_egl()
+        self.tracer = tracer or Tracer()
 
-        #create assets
-        self.shade_texture = Material("gfx/lampshade_photo.jpg")
-        self.dark_wood_texture = Material("gfx/dark_wood.jpeg")
-        self.marble_texture = Material("gfx/tessellation 2.jpeg")
-        self.shade_mesh = Mesh("models/shade_smooth.obj")
-        self.base_mesh = Mesh("models/base_smooth.obj")
-        self.ground_mesh = Mesh("models/ground.obj")
-        self.light_texture = Material("gfx/sky_back.png")
-        self.bulb_mesh = Mesh("models/bulb.obj")
-        self.moveable_object_texture = Material("gfx/wood.jpeg")
-        self.moveable_object_mesh = Mesh("models/cube.obj")
+        self.renderer = GraphicsEngine(self.tracer)
+        self.target = OffscreenTarget(SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.renderer.targetFramebuffer = self.target.framebuffer
+
+        self.scene = Scene()
+
+    def run(self, frames = None, cameraScript = None, outputDirectory = None):
+
+        #camera script entries are {position, theta, phi}, past its end the last one holds
+        if frames is None:
+            frames = len(cameraScript) if cameraScript else HEADLESS_FRAMES
+        if outputDirectory is not None:
+            os.makedirs(outputDirectory, exist_ok = True)
+
+        results = []
+        tracer = self.tracer
+        for frame in range(frames):
+            frameStart = time.perf_counter()
+            if cameraScript:
+                self.place_camera(cameraScript[min(frame, len(cameraScript) - 1)])
+            #fixed 60 fps steps, there is no real clock to follow
+            with tracer.span("scene.update"):
+                self.scene.simulate(1, 1.0)
+            with tracer.span("renderer.render"):
+                self.renderer.render(self.scene)
+
+            with tracer.span("read_pixels"):
+                image = self.target.read_pixels()
+            tracer.frame(frameStart, time.perf_counter())
+            if outputDirectory is None:
+                results.append(image)
+            else:
+                path = os.path.join(outputDirectory, f"frame_{frame:04d}.png")
+                Image.fromarray(image).save(path)
+                results.append(path)
+        return results
+
+    def place_camera(self, key):
+
+        player = self.scene.player
+        player.position[:] = key.get("position", player.position)
+        player.theta = key.get("theta", player.theta)
+        player.phi = key.get("phi", player.phi)
+        player.update_vectors()
+
+    def quit(self):
+
+        from OpenGL import EGL
+
+        self.renderer.destroy()
+        self.target.destroy()
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
+
+class Benchmark:
+
+
+    def __init__(self, warmup = BENCHMARK_WARMUP_FRAMES, tracer = None):
+
+        #startup covers the context, asset loading, shader compiles and shadow map allocation.
+        #the cold one starts without mesh and texture caches, the warm ones read what it wrote
+        clear_asset_caches()
+        self.app, self.coldStartupTime = self.start_app(tracer)
+        warmStartupTimes = []
+        for _ in range(BENCHMARK_WARM_STARTUPS):
+            self.app.quit()
+            self.app, startupTime = self.start_app(tracer)
+            warmStartupTimes.append(startupTime)
+        self.warmStartupTime = float(np.median(warmStartupTimes))
+        self.warmup = warmup
+
+    def start_app(self, tracer):
+
+        start = time.perf_counter()
+        app = HeadlessApp(tracer)
+        glFinish()
+        return app, time.perf_counter() - start
+
+    def run(self, scenarios = BENCHMARK_SCENARIOS):
+
+        #per scenario, stage times and the mean per frame of every renderer counter
+        results = {name: self.run_scenario(scenario) for name, scenario in scenarios.items()}
+        return {
+            "renderer": glGetString(GL_RENDERER).decode(),
+            "warmup": self.warmup,
+            "startup_cold": self.coldStartupTime,
+            "startup_warm": self.warmStartupTime,
+            "scenarios": {name: times for name, (times, _) in results.items()},
+            "counters": {name: counters for name, (_, counters) in results.items()},
+        }
+
+    def run_scenario(self, scenario):
+
+        #every scenario starts from a fresh scene, so results do not depend on the ones before
+        app = self.app
+        app.scene = Scene()
+        frames = scenario["frames"]
+        times = {stage: [] for stage in BENCHMARK_STAGES}
+        counters = []
+        profiler = app.renderer.gpuProfiler
+        firstFrame = profiler.frame + self.warmup
+        for frame in range(-self.warmup, frames):
+            t = max(frame, 0) / max(1, frames - 1)
+            app.place_camera(interpolate_keyframes(scenario["camera"], t))
+            app.scene.moveable_object.position = interpolate_keyframes(scenario["object"], t)
+
+            start = time.perf_counter()
+            app.scene.simulate(1, 1.0)
+            updateEnd = time.perf_counter()
+            app.renderer.render(app.scene)
+            #waits for the gpu, so frame times hold the work the render calls only queued
+            glFinish()
+            end = time.perf_counter()
+            app.tracer.record("scene.update", start, updateEnd)
+            app.tracer.record("renderer.render", updateEnd, end)
+            app.tracer.frame(start, end)
+            if frame < 0:
+                continue
+
+            times["scene_update"].append(updateEnd - start)
+            for stage, seconds in app.renderer.stageTimes.items():
+                times[stage].append(seconds)
+            times["frame"].append(end - start)
+            counters.append(app.renderer.frame_counters())
+
+            #after the finish this frame's timestamps are ready, warmup ones may still come in late
+            profiler.collect()
+            for profiledFrame, milliseconds in profiler.take_results():
+                if profiledFrame >= firstFrame:
+                    for name, value in milliseconds.items():
+                        times[f"gpu_{name}"].append(value / 1000)
+        summary = {stage: summarize_times(stageTimes) for stage, stageTimes in times.items() if stageTimes}
+        counterMeans = {
+            name: {key: float(np.mean([frame[name][key] for frame in counters])) for key in values}
+            for name, values in counters[0].items()
+        }
+        return summary, counterMeans
+
+    def quit(self):
+
+        self.app.quit()
+
+class OffscreenTarget:
+
+
+    def __init__(self, width, height):
+
+        #color and depth renderbuffers standing in for a window's default framebuffer
+        self.width = width
+        self.height = height
+        self.colorBuffer, self.depthBuffer = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.colorBuffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depthBuffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.colorBuffer)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depthBuffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            print("offscreen framebuffer is incomplete")
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def read_pixels(self):
+
+        #top row first, the way images are stored
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glReadBuffer(GL_COLOR_ATTACHMENT0)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        pixels = glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(self.height, self.width, 3)[::-1].copy()
+
+    def destroy(self):
+
+        glDeleteFramebuffers(1, (self.framebuffer,))
+        glDeleteRenderbuffers(2, (self.colorBuffer, self.depthBuffer))
+
+class GraphicsEngine:
+
+
+    def __init__(self, tracer = None):
+
+        self.tracer = tracer or Tracer()
+        #driver messages and errors from here on, debug builds only, production ones never read gl errors
+        self.debugLayer = DebugLayer() if GAME_MODE == 0 else None
+        if GAME_MODE == 1 and glErrorChecker:
+            glErrorChecker.onBegin()
+
+        #block-compressed textures when asked for and the driver can sample them
+        textureCompression = TEXTURE_COMPRESSION
+        if textureCompression is not None and not has_gl_extension("GL_EXT_texture_compression_s3tc"):
+            textureCompression = None
+
+        #create assets, decoded and parsed in parallel, uploaded here as each one finishes
+        loader = AssetLoader(textureCompression = textureCompression, tracer = self.tracer)
+        loader.add_material("shade_texture", "gfx/lampshade_photo.jpg")
+        loader.add_material("dark_wood_texture", "gfx/dark_wood.jpeg")
+        loader.add_material("marble_texture", "gfx/tessellation 2.jpeg")
+        loader.add_mesh("shade_mesh", "models/shade_smooth.obj")
+        loader.add_mesh("base_mesh", "models/base_smooth.obj")
+        loader.add_mesh("ground_mesh", "models/ground.obj")
+        loader.add_material("light_texture", "gfx/sky_back.png")
+        loader.add_mesh("bulb_mesh", "models/bulb.obj")
+        loader.add_material("moveable_object_texture", "gfx/wood.jpeg")
+        loader.add_mesh("moveable_object_mesh", "models/cube.obj")
+        assets = loader.load()
+        self.shade_texture = assets["shade_texture"]
+        self.dark_wood_texture = assets["dark_wood_texture"]
+        self.marble_texture = assets["marble_texture"]
+        self.shade_mesh = assets["shade_mesh"]
+        self.base_mesh = assets["base_mesh"]
+        self.ground_mesh = assets["ground_mesh"]
+        self.light_texture = assets["light_texture"]
+        self.bulb_mesh = assets["bulb_mesh"]
+        self.moveable_object_texture = assets["moveable_object_texture"]
+        self.moveable_object_mesh = assets["moveable_object_mesh"]
 
         #initialise opengl
         glClearColor(0.0, 0.0, 0.0, 1)
@@ -341,42 +1667,107 @@ class GraphicsEngine:
         glDepthMask(GL_TRUE)
         
 
+        #every light is a cube of one cube map array where supported, a cubemap of its own otherwise
+        self.useCubeMapArray = has_gl_extension("GL_ARB_texture_cube_map_array")
+        self.shaderDefines = [f"MAX_LIGHTS {MAX_LIGHTS}"]
+        if self.useCubeMapArray:
+            self.shaderDefines.append("CUBE_MAP_ARRAY")
+        else:
+            #without cube map arrays the fragment shader picks each light's sampler in a switch, the last light
+            #is the default case so every path returns
+            cases = [f"case {i}: return texture(depthMaps[{i}], fragToLight).r;" for i in range(MAX_LIGHTS - 1)]
+            cases.append(f"default: return texture(depthMaps[{MAX_LIGHTS - 1}], fragToLight).r;")
+            self.shaderDefines.append("DEPTH_MAP_CASES " + " ".join(cases))
+
         #create renderpasses
         self.shaderthreeD = self.createShader("shaders colorbuffer/vertex.txt", "shaders colorbuffer/fragment.txt")
         self.shader = self.createShader("shaders colorbuffer/vertex_light.txt", "shaders colorbuffer/fragment_light.txt")
         self.shadowShader = self.createGeometricShader("shaders colorbuffer/simpleDepthVertex.txt", "shaders colorbuffer/simpleDepthFragment.txt",
                                             "shaders colorbuffer/geometric.txt")
 
-        self.shadowMapResolution = 1028
+        #texture units never change, so samplers are pointed at them once
+        self.shaderthreeD.use()
+        self.shaderthreeD.set("imageTexture", 0)
+        if self.useCubeMapArray:
+            self.shaderthreeD.set("depthMaps", 1)
+        else:
+            for i in range(MAX_LIGHTS):
+                self.shaderthreeD.set(f"depthMaps[{i}]", 1 + i)
+        self.shader.use()
+        self.shader.set("imageTexture", 0)
+        glUseProgram(0)
+
+        self.far_plane = 50
+        self.projection_transform = pyrr.matrix44.create_perspective_projection(
+            fovy = 45, aspect = 640/480, 
+            near = 0.1, far = self.far_plane, dtype=np.float32
+        )
+
+        #per-frame data is uploaded once into a buffer both scene programs read,
+        #each light's cube face matrices only when that light moves
+        self.shaderthreeD.bindBlock("FrameData", FRAME_DATA_BINDING)
+        self.shader.bindBlock("FrameData", FRAME_DATA_BINDING)
+        self.shadowShader.bindBlock("ShadowData", SHADOW_DATA_BINDING)
+        self.frameData = np.zeros(1, dtype = FRAME_DATA_BLOCK)
+        self.frameDataBuffer = self.createUniformBuffer(self.frameData, FRAME_DATA_BINDING)
+
+        #cube face size per light, a cube map array holds every light at the largest of them
+        self.shadowResolutions = [SHADOW_RESOLUTION] * MAX_LIGHTS
+        #optional ShadowResolutionPolicy, picks the sizes from the screen and the frame time
+        self.shadowResolutionPolicy = None
+        self.lastRenderTime = None
+
+        #redundant binds are skipped and the rest counted, the blend function never changes
+        self.renderState = RenderState()
+        self.shadowScheduler = ShadowScheduler()
+        #framebuffer the main pass draws into, the window's unless rendering offscreen
+        self.targetFramebuffer = 0
+        #scene, item count and row count the spatial index last got mesh bounds for
+        self.indexedScene = None
+        #pass being drawn, the eye its levels of detail are picked from and pixels per unit at distance one
+        self.lodView = None
+        self.trianglesSubmitted = dict.fromkeys(LOD_PASS_BIAS, 0)
+        #cpu seconds the last frame spent in each part of render, gpu milliseconds per pass a few frames late
+        self.stageTimes = {}
+        self.gpuProfiler = GpuProfiler()
+        #main pass instances inside and outside the camera frustum last frame
+        self.visibleObjects = 0
+        self.culledObjects = 0
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        #everything the scene draws, the main pass walks it sorted, the shadow pass in insertion order
+        self.drawItems = []
+        self.add_draw_item(DrawItem("base", self.base_mesh, self.marble_texture, self.shaderthreeD))
+        self.add_draw_item(DrawItem("ground", self.ground_mesh, self.dark_wood_texture, self.shaderthreeD))
+        self.add_draw_item(DrawItem("shade", self.shade_mesh, self.shade_texture, self.shaderthreeD, twoSided = True))
+        self.add_draw_item(DrawItem("moveable_object", self.moveable_object_mesh, self.moveable_object_texture, 
+                                    self.shaderthreeD))
+        self.add_draw_item(DrawItem("bulb", self.bulb_mesh, self.light_texture, self.shader, 
+                                    translucent = True, castsShadow = False))
 
         self.make_shadow_map()
 
 
-        self.num = 0
+        self.frameNumber = 0
     
     def createShader(self, vertexFilepath, fragmentFilepath):
 
-        with open(vertexFilepath,'r') as f:
-            vertex_src = f.readlines()
+        vertex_src = read_shader(vertexFilepath, self.shaderDefines)
 
-        with open(fragmentFilepath,'r') as f:
-            fragment_src = f.readlines()
+        fragment_src = read_shader(fragmentFilepath, self.shaderDefines)
         
         shader = compileProgram(compileShader(vertex_src, GL_VERTEX_SHADER),
                                 compileShader(fragment_src, GL_FRAGMENT_SHADER), validate = False)
         
-        return shader
+        return ShaderProgram(shader)
 
     def createGeometricShader(self, vertexFilepath, fragmentFilepath, geometricFilepath):
  
-        with open(vertexFilepath,'r') as f:
-            vertex_src = f.readlines()
+        vertex_src = read_shader(vertexFilepath, self.shaderDefines)
 
-        with open(fragmentFilepath,'r') as f:
-            fragment_src = f.readlines()
+        fragment_src = read_shader(fragmentFilepath, self.shaderDefines)
 
-        with open(geometricFilepath,'r') as f:
-            geometric_src = f.readlines()
+        geometric_src = read_shader(geometricFilepath, self.shaderDefines)
         
         shader = glCreateProgram()
 
@@ -390,76 +1781,172 @@ class GraphicsEngine:
 
         glLinkProgram(shader)
         
-        return shader
+        return ShaderProgram(shader)
 
+    def createUniformBuffer(self, data, binding):
 
+        buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, buffer)
+        glBufferData(GL_UNIFORM_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, binding, buffer)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
 
-    def render(self, scene):
-        
-        glDisable(GL_BLEND)
-        #refresh screen
-        glClearColor(1.0, 1.0, 1.0, 1.0)
-        glDepthMask(GL_TRUE)
+        return buffer
 
-        far_plane = 50
+    def update_frame_data(self, scene):
 
-        aspect = self.SHADOW_WIDTH/self.SHADOW_HEIGHT
-        shadowProj = pyrr.matrix44.create_perspective_projection(fovy = np.deg2rad(90), aspect = aspect, 
-            near = 0.01, far = far_plane,)
-        
-        lightPos = scene.lights[0].position
-
-        shadow_transforms = [
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(1.0, 0.0, 0.0), 
-                                                      pyrr.vector3.create(0.0, -1.0, 0.0)),
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(-1.0, 0.0, 0.0), 
-                                                      pyrr.vector3.create(0.0,-1.0, 0.0)),
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(0.0, 1.0, 0.0), 
-                                                      pyrr.vector3.create(0.0, 0.0, 1.0)),
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(0.0,-1.0, 0.0), 
-                                                      pyrr.vector3.create(0.0, 0.0, -1.0)),
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(0.0, 0.0, 1.0), 
-                                                      pyrr.vector3.create(0.0,-1.0, 0.0)),
-            shadowProj * pyrr.matrix44.create_look_at(lightPos, lightPos + pyrr.vector3.create(0.0, 0.0,-1.0), 
-                                                      pyrr.vector3.create(0.0,-1.0, 0.0))
-        ]
+        frame = self.frameData[0]
+        frame["view"] = pyrr.matrix44.create_look_at(
+            eye = scene.player.position,
+            target = scene.player.position + scene.player.forwards,
+            up = scene.player.up, dtype = np.float32
+        )
+        frame["projection"] = self.projection_transform
+        self.viewProjection = pyrr.matrix44.multiply(frame["view"], self.projection_transform)
+        frame["cameraPosition"] = scene.player.position
+        frame["farPlane"] = self.far_plane
+        #lights past MAX_LIGHTS are left out
+        lights = scene.lights[:MAX_LIGHTS]
+        frame["lightCount"] = len(lights)
+        for i, light in enumerate(lights):
+            frame["lights"][i] = (light.position, 0, light.color, light.strength)
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frameDataBuffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.frameData.nbytes, self.frameData)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def update_shadow_data(self, shadow, light):
+
+        moved = 0.0
+        if shadow.position is not None:
+            moved = float(np.linalg.norm(light.position - shadow.position))
+        shadow.motion = SHADOW_MOTION_DECAY * shadow.motion + moved
+
+        #the cube face matrices only depend on where the light is
+        if shadow.position is not None and moved == 0:
+            return
+        shadow.position = light.position.copy()
+
+        shadowProj = pyrr.matrix44.create_perspective_projection(fovy = 90, aspect = self.SHADOW_WIDTH/self.SHADOW_HEIGHT, 
+            near = 0.01, far = self.far_plane, dtype = np.float32)
+
+        data = shadow.shadowData[0]
+        for i, (direction, up) in enumerate(CUBE_FACE_DIRECTIONS):
+            lookAt = pyrr.matrix44.create_look_at(light.position, light.position + direction, up, dtype = np.float32)
+            data["shadowMatrices"][i] = pyrr.matrix44.multiply(lookAt, shadowProj)
+        shadow.facePlanes = frustum_planes(data["shadowMatrices"])
+        data["lightPosition"] = light.position
+        data["farPlane"] = self.far_plane
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.shadowDataBuffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, shadow.index * self.shadowDataStride, 
+                        shadow.shadowData.nbytes, shadow.shadowData)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+    def update_shadows(self, scene):
+
+        lights = scene.lights[:MAX_LIGHTS]
+        shadows = self.pointShadows[:len(lights)]
+        for shadow, light in zip(shadows, lights):
+            self.update_shadow_data(shadow, light)
+
+        self.shadowsUpdated = 0
+        self.dynamicShadowCasters = 0
+        self.shadowVerticesEmitted = 0
+        self.shadowVerticesSaved = 0
+        for shadow, light in zip(shadows, lights):
+            shadow.light = light
+        for shadow in self.shadowScheduler.select(shadows, scene.player.position, self.frameNumber):
+            #casters past the light's reach cannot sit between it and anything it visibly lights
+            casters = self.group_rows(
+                scene.spatialIndex.query_sphere(shadow.position, min(light_reach(shadow.light), self.far_plane))
+            )
+            glBindBufferRange(GL_UNIFORM_BUFFER, SHADOW_DATA_BINDING, self.shadowDataBuffer, 
+                              shadow.index * self.shadowDataStride, SHADOW_DATA_BLOCK.itemsize)
+            glViewport(0, 0, shadow.resolution, shadow.resolution)
+            #a cube face spans 90 degrees, so resolution / 2 pixels per unit at distance one
+            self.set_lod_view("shadow", shadow.position, shadow.resolution / 2)
 
-        
-        glViewport(0, 0, self.SHADOW_WIDTH, self.SHADOW_HEIGHT)
-        glBindFramebuffer(GL_FRAMEBUFFER, self.depthMapFBO)
-        glUseProgram(self.shadowShader)
+            #every update starts from the baked static casters, only dynamic ones are drawn on top
+            self.bake_static_shadows(scene, shadow, casters)
+            self.copy_shadow_faces(self.shadowTarget, shadow.staticTexture, shadow.firstLayer, 
+                                   self.shadowTarget, shadow.texture, shadow.firstLayer, shadow.resolution)
 
+            glBindFramebuffer(GL_FRAMEBUFFER, shadow.framebuffer)
+            self.renderState.set_uniform(self.shadowShader, "cubeLayer", shadow.cubeLayer)
+            static = scene.transforms.static
+            for item in self.shadowCasters:
+                rows = casters[item]
+                if self.draw_shadow_caster(scene, item, shadow, rows[~static[rows]]):
+                    self.dynamicShadowCasters += 1
 
+            shadow.updatedFrame = self.frameNumber
+            self.shadowsUpdated += 1
 
-        glClearDepth(1.0)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glDepthMask(GL_TRUE)
+    def draw_shadow_caster(self, scene, item, shadow, indices):
 
-        i = 0
-        while (i < 6):
-            glUniformMatrix4fv(
-                glGetUniformLocation(self.shadowShader, f"shadowMatrices[{i}]"), 1, GL_FALSE, shadow_transforms[i]
-            )
-            i = i + 1
-        
-        glUniform1f(glGetUniformLocation(self.shadowShader, "far_plane"), far_plane)
-        glUniform3fv(glGetUniformLocation(self.shadowShader, "lightPos"), 1, lightPos)
+        if len(indices) == 0:
+            return False
+
+        #world bounding spheres of every instance, the model matrices carry no scale
+        models = scene.transforms.models[indices]
+        centers = item.mesh.boundingCenter @ models[:, :3, :3] + models[:, 3, :3]
+
+        #the geometry shader only emits to faces in the mask, one mask covers all instances of a draw
+        mask = sphere_face_mask(centers, item.mesh.boundingRadius, shadow.facePlanes)
+        faces = bin(mask).count("1")
+        lods = self.select_lods(scene, item, indices)
+        vertices = int(item.mesh.lods["indexCount"][lods].sum())
+        self.shadowVerticesEmitted += vertices * faces
+        self.shadowVerticesSaved += vertices * (6 - faces)
+        if mask == 0:
+            return False
 
-        modelmatshadow = glGetUniformLocation(self.shadowShader, "model")
+        self.renderState.set_uniform(self.shadowShader, "faceMask", mask)
+        self.draw_item(scene, item, indices, lods = lods)
+        return True
 
+    def bind_shadow_maps(self):
 
-        self.render_base(scene, modelmatshadow)
+        if self.useCubeMapArray:
+            self.renderState.bind_texture(1, GL_TEXTURE_CUBE_MAP_ARRAY, self.depthCubemap)
+            return
+        for shadow in self.pointShadows:
+            self.renderState.bind_texture(1 + shadow.index, GL_TEXTURE_CUBE_MAP, shadow.texture)
 
-        self.render_ground(scene, modelmatshadow)
 
-        self.render_shade(scene, modelmatshadow)
 
-        self.render_moveable_object(scene, modelmatshadow)
+    def render(self, scene):
+        
+        setupStart = time.perf_counter()
+        self.gpuProfiler.begin_frame()
+        glDisable(GL_BLEND)
+        #refresh screen
+        glClearColor(1.0, 1.0, 1.0, 1.0)
+        glDepthMask(GL_TRUE)
+
+        self.update_frame_data(scene)
+        moved = scene.transforms.update(self.viewProjection)
+        self.index_scene(scene)
+        scene.spatialIndex.update(moved)
+        if self.shadowResolutionPolicy is not None:
+            self.apply_shadow_resolution_policy(scene)
+        self.renderState.reset()
+        self.trianglesSubmitted = dict.fromkeys(LOD_PASS_BIAS, 0)
+        self.frameNumber += 1
+
+        
+        shadowStart = time.perf_counter()
+        self.gpuProfiler.begin_pass("shadow")
+        self.renderState.use_program(self.shadowShader)
+        glClearDepth(1.0)
+
+        self.update_shadows(scene)
+        mainStart = time.perf_counter()
+        self.gpuProfiler.begin_pass("main")
     
 
-        glBindFramebuffer(GL_FRAMEBUFFER, 0)
-        glUseProgram(0)
-        glUseProgram(self.shaderthreeD)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.targetFramebuffer)
 
         #then render scene as normal with shadow mapping (using depth cubemap)
         glViewport(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
@@ -470,247 +1957,395 @@ class GraphicsEngine:
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
         
-        glUniform1i(glGetUniformLocation(self.shaderthreeD, "imageTexture"), 0)
+        self.bind_shadow_maps()
+        self.set_lod_view("main", scene.player.position, SCREEN_HEIGHT * self.projection_transform[1][1] / 2)
+        visible = self.cull_render_queue(scene)
+        translucentStart = None
+        for item in self.renderQueue:
+            #blended items come last in the queue
+            if item.translucent and translucentStart is None:
+                translucentStart = time.perf_counter()
+                self.gpuProfiler.begin_pass("translucent")
+            if len(visible[item]) == 0:
+                continue
+            self.renderState.set_blend(item.translucent)
+            self.renderState.use_program(item.program)
+            self.renderState.set_uniform(item.program, "twoSided", item.twoSided)
+            self.renderState.bind_texture(0, GL_TEXTURE_2D, item.material.texture)
+            self.draw_item(scene, item, visible[item], textured = True)
+        self.gpuProfiler.end_frame()
+        end = time.perf_counter()
+        if translucentStart is None:
+            translucentStart = end
+        self.stageTimes = {
+            "setup": shadowStart - setupStart,
+            "shadow": mainStart - shadowStart,
+            "main": translucentStart - mainStart,
+            "translucent": end - translucentStart,
+        }
+        self.tracer.record("setup", setupStart, shadowStart)
+        self.tracer.record("shadow pass", shadowStart, mainStart)
+        self.tracer.record("main pass", mainStart, translucentStart)
+        self.tracer.record("translucent pass", translucentStart, end)
+        for name, values in self.frame_counters().items():
+            self.tracer.counter(name, end, values)
+        if self.debugLayer is not None:
+            self.debugLayer.end_frame()
+
+    def frame_counters(self):
+
+        #what the last frame culled, skipped and submitted
+        return {
+            "objects": {"visible": self.visibleObjects, "culled": self.culledObjects},
+            "shadow vertices": {"emitted": self.shadowVerticesEmitted, "saved": self.shadowVerticesSaved},
+            "triangles submitted": dict(self.trianglesSubmitted),
+        }
 
-        projection_transform = pyrr.matrix44.create_perspective_projection(
-            fovy = 45, aspect = 640/480, 
-            near = 0.1, far = far_plane, dtype=np.float32
-        )
-        glUniformMatrix4fv(
-            glGetUniformLocation(self.shaderthreeD,"projection"),
-            1, GL_FALSE, projection_transform
+    def add_draw_item(self, item):
+
+        self.drawItems.append(item)
+        self.renderQueue = sorted(self.drawItems, key = DrawItem.sortKey)
+        self.shadowCasters = [item for item in self.drawItems if item.castsShadow]
+        self.indexedScene = None
+
+    def index_scene(self, scene):
+
+        #the index learns the mesh bounds at every row, the engine which queue item every row belongs to
+        key = (scene, len(self.drawItems), scene.transforms.count)
+        if self.indexedScene is not None and all(a is b or a == b for a, b in zip(key, self.indexedScene)):
+            return
+        self.indexedScene = key
+        self.itemRows = {}
+        self.rowItems = np.full(scene.transforms.count, -1, dtype=np.intp)
+        for i, item in enumerate(self.renderQueue):
+            rows = np.array([component.index for component in self.item_components(scene, item)], dtype=np.intp)
+            self.itemRows[item] = rows
+            self.rowItems[rows] = i
+            scene.spatialIndex.set_bounds(rows, item.mesh.boundingCenter, item.mesh.boundingRadius)
+
+    def group_rows(self, rows):
+
+        #rows from an index query split per render queue item
+        rows = rows[self.rowItems[rows] >= 0]
+        rows = rows[np.argsort(self.rowItems[rows], kind = "stable")]
+        bounds = np.searchsorted(self.rowItems[rows], np.arange(len(self.renderQueue) + 1))
+        return {item: rows[bounds[i]:bounds[i + 1]] for i, item in enumerate(self.renderQueue)}
+
+    def cull_render_queue(self, scene):
+
+        #the index hands back the instances whose spheres reach the frustum, their boxes are tested in one go
+        planes = frustum_planes(self.viewProjection)
+        grouped = self.group_rows(scene.spatialIndex.query_frustum(planes))
+        counts = [len(grouped[item]) for item in self.renderQueue]
+        meshes = [item.mesh for item in self.renderQueue]
+        indices = np.concatenate([grouped[item] for item in self.renderQueue])
+        visible = frustum_cull(
+            planes, scene.transforms.models[indices],
+            np.repeat([mesh.boundingCenter for mesh in meshes], counts, axis = 0),
+            np.repeat([mesh.boundingExtents for mesh in meshes], counts, axis = 0),
+            np.repeat([mesh.boundingRadius for mesh in meshes], counts)
         )
-        modelmatobjloc = glGetUniformLocation(self.shaderthreeD, "model")
 
-        self.viewMatrixLocation = glGetUniformLocation(self.shaderthreeD, "view")
-        
-        self.lightLocation = {
-            "position": glGetUniformLocation(self.shaderthreeD, f"Light.position"),
-            "color": glGetUniformLocation(self.shaderthreeD, f"Light.color"),
-            "strength":  glGetUniformLocation(self.shaderthreeD, f"Light.strength")
+        self.visibleObjects = int(visible.sum())
+        self.culledObjects = sum(len(rows) for rows in self.itemRows.values()) - self.visibleObjects
+        return {
+            item: itemRows[itemVisible]
+            for item, itemRows, itemVisible in zip(self.renderQueue, (grouped[item] for item in self.renderQueue), 
+                                                    np.split(visible, np.cumsum(counts)[:-1]))
         }
-        self.cameraPosLoc = glGetUniformLocation(self.shaderthreeD, "cameraPosition")
 
-        self.specularLoc = glGetUniformLocation(self.shaderthreeD, "specularOn")
-        self.twoSidedLoc = glGetUniformLocation(self.shaderthreeD, "twoSided")
-        self.depthMapLoc = glGetUniformLocation(self.shaderthreeD, "depthMap")
-        self.farPlaneLoc = glGetUniformLocation(self.shaderthreeD, "far_plane")
+    def pick(self, scene, x = SCREEN_WIDTH / 2, y = SCREEN_HEIGHT / 2):
+
+        #ray from the camera through a pixel, the nearest mesh box it hits as (item, component) or None
+        inverse = np.linalg.inv(self.viewProjection)
+        ndcX, ndcY = 2 * x / SCREEN_WIDTH - 1, 1 - 2 * y / SCREEN_HEIGHT
+        near = np.array([ndcX, ndcY, -1, 1], dtype=np.float32) @ inverse
+        far = np.array([ndcX, ndcY, 1, 1], dtype=np.float32) @ inverse
+        origin = near[:3] / near[3]
+        direction = far[:3] / far[3] - origin
+
+        rows, distances = scene.spatialIndex.query_ray(origin, direction)
+        rows = rows[self.rowItems[rows] >= 0]
+        if len(rows) == 0:
+            return None
+
+        #spheres only narrow it down, the ray is tested against each box in its model space
+        models = scene.transforms.models[rows]
+        rotations = models[:, :3, :3]
+        meshes = [self.renderQueue[i].mesh for i in self.rowItems[rows]]
+        centers = np.array([mesh.boundingCenter for mesh in meshes])
+        extents = np.array([mesh.boundingExtents for mesh in meshes])
+        localOrigins = np.einsum("nj,nij->ni", origin - models[:, 3, :3], rotations)
+        localDirections = np.einsum("j,nij->ni", direction / np.linalg.norm(direction), rotations)
+        entry, leave = ray_slabs(localOrigins, localDirections, centers - extents, centers + extents)
+        hit = (entry <= leave) & (leave >= 0)
+        if not hit.any():
+            return None
+
+        row = rows[hit][np.argmin(np.maximum(entry[hit], 0))]
+        item = self.renderQueue[self.rowItems[row]]
+        for component in self.item_components(scene, item):
+            if component.index == row:
+                return item, component
+
+    def item_components(self, scene, item):
+
+        #an item names either one component or a list of copies sharing its mesh
+        components = getattr(scene, item.name)
+        if isinstance(components, SimpleComponent):
+            return [components]
+        return components
+
+    def set_lod_view(self, renderPass, eye, pixelsPerUnit):
+
+        self.lodView = (renderPass, eye, pixelsPerUnit)
+
+    def select_lods(self, scene, item, indices):
+
+        #coarsest level whose error, seen from the pass's eye, stays under its share of LOD_ERROR_PIXELS
+        errors = item.mesh.lods["error"]
+        if len(errors) == 1:
+            return np.zeros(len(indices), dtype=np.intp)
+        renderPass, eye, pixelsPerUnit = self.lodView
+        models = scene.transforms.models[indices]
+        centers = item.mesh.boundingCenter @ models[:, :3, :3] + models[:, 3, :3]
+        distances = np.maximum(np.linalg.norm(centers - eye, axis = 1) - item.mesh.boundingRadius, 1e-3)
+        allowed = LOD_ERROR_PIXELS * LOD_PASS_BIAS[renderPass] * distances / pixelsPerUnit
+        return (errors[None, :] <= allowed[:, None]).sum(axis = 1) - 1
+
+    def draw_item(self, scene, item, indices = None, textured = False, lods = None):
+
+        #transform store rows to draw, every component of the item unless culled down, and their levels of detail
+        #when the caller already picked them
+        if indices is None:
+            indices = [component.index for component in self.item_components(scene, item)]
+        indices = np.asarray(indices, dtype = np.intp)
+        self.renderState.bind_vertex_array(item.mesh.vao)
+
+        #instances are sorted by level of detail, so each level draws one contiguous run
+        if lods is None:
+            lods = self.select_lods(scene, item, indices)
+        order = np.argsort(lods, kind = "stable")
+        indices, lods = indices[order], lods[order]
+
+        #instance matrices are gathered at most once a frame per set of rows, passes drawing the same rows share them
+        key = (item, self.frameNumber, indices.tobytes())
+        if item.mesh.instance_key != key:
+            instances = np.empty(len(indices), dtype = INSTANCE_DATA)
+            instances["model"] = scene.transforms.models[indices]
+            instances["modelViewProjection"] = scene.transforms.modelViewProjections[indices]
+            item.mesh.set_instances(instances)
+            item.mesh.instance_key = key
+
+        starts = np.flatnonzero(np.diff(lods, prepend = -1))
+        for start, end in zip(starts.tolist(), starts[1:].tolist() + [len(lods)]):
+            item.mesh.set_instance_offset(start)
+            if textured and item.submeshMaterials is not None:
+                #one draw per submesh of the level, each with its own texture
+                for material, (first, count) in zip(item.submeshMaterials, item.mesh.submeshLods[lods[start]].tolist()):
+                    if count > 0:
+                        self.renderState.bind_texture(0, GL_TEXTURE_2D, material.texture)
+                        self.draw_elements(item, first, count, end - start)
+            else:
+                lod = item.mesh.lods[lods[start]]
+                self.draw_elements(item, int(lod["firstIndex"]), int(lod["indexCount"]), end - start)
+
+    def draw_elements(self, item, first, count, instances):
+
+        glDrawElementsInstanced(GL_TRIANGLES, count, item.mesh.index_type, 
+                                ctypes.c_void_p(first * item.mesh.indices.itemsize), instances)
+        self.renderState.drawCalls += 1
+        self.renderState.instancesDrawn += instances
+        self.trianglesSubmitted[self.lodView[0]] += count // 3 * instances
 
-        glUniform1f(self.farPlaneLoc, far_plane)
 
-        view_transform = pyrr.matrix44.create_look_at(
-            eye = scene.player.position,
-            target = scene.player.position + scene.player.forwards,
-            up = scene.player.up, dtype = np.float32
-        )
-        glUniformMatrix4fv(self.viewMatrixLocation, 1, GL_FALSE, view_transform)
+    def make_shadow_map(self):
+        self.SHADOW_WIDTH = max(self.shadowResolutions)
+        self.SHADOW_HEIGHT = self.SHADOW_WIDTH
+        self.shadowAttachment = GL_COLOR_ATTACHMENT0
+        self.shadowFormat = (GL_RGBA16F, GL_RGBA)
+        self.canCopyImage = has_gl_extension("GL_ARB_copy_image")
+
+        #static casters are drawn into a scratch cubemap and kept per light, to be copied in under the dynamic ones
+        self.bakeCubemap = self.make_shadow_cubemap()
+        self.bakeFBO = self.make_shadow_framebuffer(self.bakeCubemap)
+        self.shadowCopyFBO = glGenFramebuffers(1)
+        if self.shadowAttachment == GL_DEPTH_ATTACHMENT:
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, self.shadowCopyFBO)
+            glReadBuffer(GL_NONE)
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+
+        self.pointShadows = []
+        if self.useCubeMapArray:
+            self.shadowTarget = GL_TEXTURE_CUBE_MAP_ARRAY
+            self.depthCubemap = self.make_shadow_cubemap(self.shadowTarget, MAX_LIGHTS)
+            self.depthMapFBO = self.make_shadow_framebuffer(self.depthCubemap)
+            staticCubemap = self.make_shadow_cubemap(self.shadowTarget, MAX_LIGHTS)
+            for i in range(MAX_LIGHTS):
+                self.pointShadows.append(PointShadow(i, self.depthMapFBO, self.depthCubemap, staticCubemap, 6 * i, 
+                                                     self.SHADOW_WIDTH))
+        else:
+            self.shadowTarget = GL_TEXTURE_CUBE_MAP
+            for i, resolution in enumerate(self.shadowResolutions):
+                depthCubemap = self.make_shadow_cubemap(resolution = resolution)
+                self.pointShadows.append(PointShadow(i, self.make_shadow_framebuffer(depthCubemap), depthCubemap, 
+                                                     self.make_shadow_cubemap(resolution = resolution), 0, resolution))
+
+        #one ShadowData block per light, bound by range before drawing that light
+        alignment = int(glGetIntegerv(GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT))
+        self.shadowDataStride = -(-SHADOW_DATA_BLOCK.itemsize // alignment) * alignment
+        self.shadowDataBuffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.shadowDataBuffer)
+        glBufferData(GL_UNIFORM_BUFFER, MAX_LIGHTS * self.shadowDataStride, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+
+        self.staticShadowBakes = 0
+        self.dynamicShadowCasters = 0
+        self.shadowsUpdated = 0
+        #geometry shader vertices sent to cube faces this frame, and those left out by face culling
+        self.shadowVerticesEmitted = 0
+        self.shadowVerticesSaved = 0
+
+    def make_shadow_cubemap(self, target = GL_TEXTURE_CUBE_MAP, cubes = 1, resolution = None):
+        if resolution is None:
+            resolution = self.SHADOW_WIDTH
+        depthCubemap = glGenTextures(1)
+
+        glBindTexture(target, depthCubemap)
+
+        glTexParameteri(target, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(target, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(target, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(target, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexParameteri(target, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
+        glTexParameteri(target, GL_TEXTURE_BASE_LEVEL, 0)
+        glTexParameteri(target, GL_TEXTURE_MAX_LEVEL, 0)
+
+        internalFormat, pixelFormat = self.shadowFormat
+        if target == GL_TEXTURE_CUBE_MAP_ARRAY:
+            #six layers per cube, one cube per light
+            glTexImage3D(GL_TEXTURE_CUBE_MAP_ARRAY, 0, internalFormat, 
+                     resolution, resolution, 6 * cubes, 0, pixelFormat, GL_FLOAT, None)
+        else:
+            i = 0
+            while (i < 6):
+                glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + i, 0, internalFormat, 
+                         resolution, resolution, 0, pixelFormat, GL_FLOAT, None)
+                i = i + 1
+
+        return depthCubemap
+
+    def make_shadow_framebuffer(self, depthCubemap):
+        depthMapFBO = glGenFramebuffers(1)
 
-        glUniform3fv(self.cameraPosLoc, 1, scene.player.position)
-        glUniform1i(self.twoSidedLoc, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, depthMapFBO)
 
-        glUniform1i(glGetUniformLocation(self.shaderthreeD, "depthMap"), 1)
+        glFramebufferTexture(GL_FRAMEBUFFER, self.shadowAttachment, depthCubemap, 0) 
 
-        glUniform1i(glGetUniformLocation(self.shaderthreeD, "imageTexture"), 0)
+        glEnable(GL_DEPTH_TEST)
+        glDepthFunc(GL_LESS)    
+        glDrawBuffers([GL_COLOR_ATTACHMENT0])
 
-        light = scene.lights[0]
-        glUniform3fv(self.lightLocation["position"], 1, light.position)
-        glUniform3fv(self.lightLocation["color"], 1, light.color)
-        glUniform1f(self.lightLocation["strength"], light.strength)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            print("oh no!!")
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
 
-        self.shade_texture.use()
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.depthCubemap)
-        glUniform1i(self.twoSidedLoc, 1)
-        self.render_shade(scene, modelmatobjloc)
+        return depthMapFBO
 
-        self.marble_texture.use()
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.depthCubemap)
-        glUniform1i(self.twoSidedLoc, 0)
-        self.render_base(scene, modelmatobjloc)
+    def bake_static_shadows(self, scene, shadow, casters):
 
-        self.dark_wood_texture.use()
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.depthCubemap)
-        self.render_ground(scene, modelmatobjloc)
+        #the store's static version covers every static row, so checking a bake never looks at the rows themselves
+        key = (scene.transforms, scene.transforms.staticVersion, shadow.position.tobytes())
+        if key == shadow.staticKey:
+            return
+        shadow.staticKey = key
+        self.staticShadowBakes += 1
 
-        self.moveable_object_texture.use()
-        glActiveTexture(GL_TEXTURE1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.depthCubemap)
-        self.render_moveable_object(scene, modelmatobjloc)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.bakeFBO)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.renderState.set_uniform(self.shadowShader, "cubeLayer", 0)
+        static = scene.transforms.static
+        for item in self.shadowCasters:
+            rows = casters[item]
+            self.draw_shadow_caster(scene, item, shadow, rows[static[rows]])
+        #a light smaller than the scratch cubemap only bakes into its corner
+        self.copy_shadow_faces(GL_TEXTURE_CUBE_MAP, self.bakeCubemap, 0, 
+                               self.shadowTarget, shadow.staticTexture, shadow.firstLayer, shadow.resolution)
+
+    def copy_shadow_faces(self, sourceTarget, source, sourceLayer, destinationTarget, destination, destinationLayer, 
+                          resolution):
+
+        #six faces from each, layers count faces across the cubes of a cube map array
+        if self.canCopyImage:
+            glCopyImageSubData(source, sourceTarget, 0, 0, 0, sourceLayer,
+                               destination, destinationTarget, 0, 0, 0, destinationLayer,
+                               resolution, resolution, 6)
+            return
+
+        #without copy_image each face is read back through a framebuffer into the texture bound on the active unit
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.shadowCopyFBO)
+        self.renderState.bind_texture(1, destinationTarget, destination)
+        for face in range(6):
+            if sourceTarget == GL_TEXTURE_CUBE_MAP_ARRAY:
+                glFramebufferTextureLayer(GL_READ_FRAMEBUFFER, self.shadowAttachment, source, 0, sourceLayer + face)
+            else:
+                glFramebufferTexture2D(GL_READ_FRAMEBUFFER, self.shadowAttachment, 
+                                       GL_TEXTURE_CUBE_MAP_POSITIVE_X + face, source, 0)
+            if destinationTarget == GL_TEXTURE_CUBE_MAP_ARRAY:
+                glCopyTexSubImage3D(GL_TEXTURE_CUBE_MAP_ARRAY, 0, 0, 0, destinationLayer + face, 0, 0, 
+                                    resolution, resolution)
+            else:
+                glCopyTexSubImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + face, 0, 0, 0, 0, 0, 
+                                    resolution, resolution)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, 0)
+
+    def set_shadow_resolution(self, resolution, index = None):
+
+        #one light's cube face size, or every light's when no index is given
+        resolutions = list(self.shadowResolutions)
+        if index is None:
+            resolutions = [resolution] * MAX_LIGHTS
+        else:
+            resolutions[index] = resolution
+        return self.resize_shadow_maps(resolutions)
+
+    def resize_shadow_maps(self, resolutions):
+
+        largest = int(glGetIntegerv(GL_MAX_CUBE_MAP_TEXTURE_SIZE))
+        resolutions = [min(max(1, int(resolution)), largest) for resolution in resolutions]
+        if resolutions == self.shadowResolutions:
+            return False
+        self.shadowResolutions = resolutions
+
+        #fresh maps have nothing in them, so every light is redrawn on the next frame
+        self.destroy_shadow_maps()
+        self.make_shadow_map()
+        return True
 
-        glUseProgram(self.shader) #Render translucent object
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    def apply_shadow_resolution_policy(self, scene):
 
-        projection_transform = pyrr.matrix44.create_perspective_projection(
-            fovy = 45, aspect = 640/480, 
-            near = 0.1, far = far_plane, dtype=np.float32
-        )
-        glUniformMatrix4fv(
-            glGetUniformLocation(self.shader,"projection"),
-            1, GL_FALSE, projection_transform
-        )
-        modelmatobjloc2 = glGetUniformLocation(self.shader, "model")
-        self.viewMatrixLocation = glGetUniformLocation(self.shader, "view")
-        self.tintLoc = glGetUniformLocation(self.shader, "tint")
+        now = time.perf_counter()
+        if self.lastRenderTime is not None:
+            self.shadowResolutionPolicy.record_frame_time(now - self.lastRenderTime)
+        self.lastRenderTime = now
 
-        view_transform = pyrr.matrix44.create_look_at(
-            eye = scene.player.position,
-            target = scene.player.position + scene.player.forwards,
-            up = scene.player.up, dtype = np.float32
-        )
-        glUniformMatrix4fv(self.viewMatrixLocation, 1, GL_FALSE, view_transform)
-        
-        light = scene.lights[0]
-
-        glUniform3fv(self.tintLoc, 1, light.color)
-        self.light_texture.use()
-        self.render_bulb(scene, modelmatobjloc2)
-        glFlush()
-        if self.num < 2:
-            print(glGetError())
-            self.num += 1
-
-    def render_base(self, scene, modelloc):
-        base = scene.base
-        model_transform = pyrr.matrix44.create_identity(dtype=np.float32)
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_eulers(
-                eulers=np.radians(base.eulers), dtype=np.float32
-            )
-        )
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_translation(
-                vec=np.array(base.position),dtype=np.float32
-            )
+        resolutions = self.shadowResolutionPolicy.choose(
+            scene.lights[:MAX_LIGHTS], scene.player.position, self.projection_transform, SCREEN_HEIGHT
         )
-        glUniformMatrix4fv(modelloc,1,GL_FALSE,model_transform)
-        glBindVertexArray(self.base_mesh.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.base_mesh.vertex_count)
-        #glBindVertexArray(0)
-
-    def render_shade(self, scene, modelloc):
-        shade = scene.shade
-        model_transform = pyrr.matrix44.create_identity(dtype=np.float32)
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_eulers(
-                eulers=np.radians(shade.eulers), dtype=np.float32
-            )
-        )
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_translation(
-                vec=np.array(shade.position),dtype=np.float32
-            )
-        )
-        glUniformMatrix4fv(modelloc,1,GL_FALSE,model_transform)
-        glBindVertexArray(self.shade_mesh.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.shade_mesh.vertex_count)
-        #glBindVertexArray(0)
-
-    def render_bulb(self, scene, modelloc):
-        bulb = scene.bulb
-        model_transform = pyrr.matrix44.create_identity(dtype=np.float32)
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_eulers(
-                eulers=np.radians(bulb.eulers), dtype=np.float32
-            )
-        )
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_translation(
-                vec=np.array(bulb.position),dtype=np.float32
-            )
-        )
-        glUniformMatrix4fv(modelloc,1,GL_FALSE,model_transform)
-        glBindVertexArray(self.bulb_mesh.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.bulb_mesh.vertex_count)
-        #glBindVertexArray(0)
-
-
-    def render_ground(self, scene, modelloc):
-        ground = scene.ground
-        model_transform = pyrr.matrix44.create_identity(dtype=np.float32)
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_eulers(
-                eulers=np.radians(ground.eulers), dtype=np.float32
-            )
-        )
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_translation(
-                vec=np.array(ground.position),dtype=np.float32
-            )
-        )
-        glUniformMatrix4fv(modelloc,1,GL_FALSE,model_transform)
-        glBindVertexArray(self.ground_mesh.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.ground_mesh.vertex_count)
-        #glBindVertexArray(0)
-    
-    def render_moveable_object(self, scene, modelloc):
-        moveable = scene.moveable_object
-        model_transform = pyrr.matrix44.create_identity(dtype=np.float32)
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_eulers(
-                eulers=np.radians(moveable.eulers), dtype=np.float32
-            )
-        )
-        model_transform = pyrr.matrix44.multiply(
-            m1=model_transform, 
-            m2=pyrr.matrix44.create_from_translation(
-                vec=np.array(moveable.position),dtype=np.float32
-            )
-        )
-        glUniformMatrix4fv(modelloc,1,GL_FALSE,model_transform)
-        glBindVertexArray(self.moveable_object_mesh.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.moveable_object_mesh.vertex_count)
-        #glBindVertexArray(0)
-
-
-
-    def make_shadow_map(self):
-        self.SHADOW_WIDTH = 100
-        self.SHADOW_HEIGHT = 100
-        self.depthMapFBO = glGenFramebuffers(1)
-        self.depthCubemap = glGenTextures(1)
+        if resolutions is not None:
+            self.resize_shadow_maps(resolutions + [min(resolutions)] * (MAX_LIGHTS - len(resolutions)))
 
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.depthCubemap)
-        
-
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_BASE_LEVEL, 0)
-        glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAX_LEVEL, 0)
+    def destroy_shadow_maps(self):
 
-        i = 0
-        while (i < 6):
-            glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + i, 0, GL_RGBA16F, 
-                     self.SHADOW_WIDTH, self.SHADOW_HEIGHT, 0, GL_RGBA, GL_FLOAT, 0)
-            i = i + 1
-
-        glBindFramebuffer(GL_FRAMEBUFFER, 0)
-        glBindFramebuffer(GL_FRAMEBUFFER, self.depthMapFBO)
-
-        glFramebufferTexture(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, self.depthCubemap, 0) 
-
-        glEnable(GL_DEPTH_TEST)
-        glDepthFunc(GL_LESS)    
-        glDrawBuffers([GL_COLOR_ATTACHMENT0])
-
-        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
-            print("oh no!!")
-        glBindFramebuffer(GL_FRAMEBUFFER, 0)
-    
+        textures = {self.bakeCubemap}
+        framebuffers = {self.bakeFBO, self.shadowCopyFBO}
+        for shadow in self.pointShadows:
+            textures |= {shadow.texture, shadow.staticTexture}
+            framebuffers.add(shadow.framebuffer)
+        glDeleteTextures(len(textures), list(textures))
+        glDeleteFramebuffers(len(framebuffers), list(framebuffers))
+        glDeleteBuffers(1, (self.shadowDataBuffer,))
 
     def destroy(self):
 
@@ -725,28 +2360,645 @@ class GraphicsEngine:
 
         self.moveable_object_texture.destroy()
         self.moveable_object_mesh.destroy()
-        glDeleteProgram(self.shader)
-        glDeleteProgram(self.shaderthreeD)
-        glDeleteProgram(self.shadowShader)
-        glDeleteBuffers(1, self.depthMapFBO)
-        glDeleteTextures(1, self.depthCubemap)
+        self.shader.destroy()
+        self.shaderthreeD.destroy()
+        self.shadowShader.destroy()
+        self.gpuProfiler.destroy()
+        if self.debugLayer is not None:
+            self.debugLayer.destroy()
+        glDeleteBuffers(1, (self.frameDataBuffer,))
+        self.destroy_shadow_maps()
+
+class ShaderProgram:
+
+
+    def __init__(self, program):
+
+        self.program = program
+
+        #name -> (location, gl type), queried once after linking so drawing never has to
+        self.uniforms = {}
+        for i in range(glGetProgramiv(program, GL_ACTIVE_UNIFORMS)):
+            name, size, uniformType = glGetActiveUniform(program, i)
+            name = name.decode()
+            if name.endswith("[0]"):
+                #arrays report their first element, every element gets its own entry
+                names = [f"{name[:-3]}[{j}]" for j in range(size)]
+            else:
+                names = [name]
+            for elementName in names:
+                location = glGetUniformLocation(program, elementName)
+                #members of uniform blocks have no location
+                if location >= 0:
+                    self.uniforms[elementName] = (location, int(uniformType))
+
+        self.attributes = {}
+        for i in range(glGetProgramiv(program, GL_ACTIVE_ATTRIBUTES)):
+            name, size, attributeType = glGetActiveAttrib(program, i)
+            name = name.decode()
+            self.attributes[name] = (glGetAttribLocation(program, name), int(attributeType))
+
+    def use(self):
+        glUseProgram(self.program)
+
+    def bindBlock(self, name, binding):
+        #blocks the linker dropped are skipped
+        index = glGetUniformBlockIndex(self.program, name)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(self.program, index, binding)
+
+    def set(self, name, value):
+        #the program must be in use, the glUniform* call is picked from the uniform's type
+        uniform = self.uniforms.get(name)
+        if uniform is not None:
+            UNIFORM_SETTERS[uniform[1]](uniform[0], value)
+
+    def destroy(self):
+        glDeleteProgram(self.program)
+
+class PointShadow:
+
+
+    def __init__(self, index, framebuffer, texture, staticTexture, firstLayer, resolution):
+
+        #slot in the shadow uniform buffer and in the fragment shader's light array
+        self.index = index
+        #where the light's six faces live, firstLayer counts faces into a cube map array
+        self.framebuffer = framebuffer
+        self.texture = texture
+        self.staticTexture = staticTexture
+        self.firstLayer = firstLayer
+        #cube gl_Layer is offset to while drawing into a shared array
+        self.cubeLayer = firstLayer // 6
+        #six inward planes for each of the six faces, built with the matrices
+        self.facePlanes = None
+        #size of each face actually drawn and sampled
+        self.resolution = resolution
+        self.shadowData = np.zeros(1, dtype = SHADOW_DATA_BLOCK)
+
+        #light position the matrices were built for, and the static casters were baked against
+        self.position = None
+        self.staticKey = None
+        self.updatedFrame = None
+        #decaying sum of how far the light moved lately
+        self.motion = 0.0
+        #scene light drawn into this cubemap
+        self.light = None
+
+class ShadowScheduler:
+
+
+    def __init__(self, budget = SHADOW_UPDATES_PER_FRAME):
+
+        self.budget = budget
+
+    def priority(self, shadow, cameraPosition, frameNumber):
+
+        #never drawn comes first, then lights that are stale, moving and close to the camera
+        if shadow.updatedFrame is None:
+            return np.inf
+        staleness = frameNumber - shadow.updatedFrame
+        distance = max(1.0, float(np.linalg.norm(shadow.position - cameraPosition)))
+        return staleness * (1 + shadow.motion) / distance
+
+    def select(self, shadows, cameraPosition, frameNumber):
+
+        if len(shadows) <= self.budget:
+            return list(shadows)
+        #a light with nothing in its cubemap yet is drawn even past the budget
+        fresh = [shadow for shadow in shadows if shadow.updatedFrame is None]
+        stale = [shadow for shadow in shadows if shadow.updatedFrame is not None]
+        return fresh + sorted(
+            stale, key = lambda shadow: self.priority(shadow, cameraPosition, frameNumber), reverse = True
+        )[:max(0, self.budget - len(fresh))]
+
+class ShadowResolutionPolicy:
+
+
+    def __init__(self, resolutions = SHADOW_RESOLUTIONS, frameBudget = SHADOW_FRAME_BUDGET, 
+                 cooldown = SHADOW_POLICY_COOLDOWN):
+
+        self.resolutions = sorted(resolutions)
+        self.frameBudget = frameBudget
+        self.cooldown = cooldown
+        #index of the largest size allowed right now, lowered while frames run over budget
+        self.maxLevel = len(self.resolutions) - 1
+        self.frameTime = None
+        self.framesSinceChange = cooldown
+        self.current = None
+
+    def record_frame_time(self, frameTime):
+
+        if self.frameTime is None:
+            self.frameTime = frameTime
+        else:
+            self.frameTime = 0.9 * self.frameTime + 0.1 * frameTime
+
+    def light_pixels(self, light, cameraPosition, projection, viewportHeight):
+
+        #screen height in pixels covered by the sphere the light still reaches
+        reach = light_reach(light)
+        distance = float(np.linalg.norm(light.position - cameraPosition))
+        if distance <= reach:
+            return viewportHeight
+        return min(viewportHeight, viewportHeight * projection[1][1] * reach / distance)
+
+    def choose(self, lights, cameraPosition, projection, viewportHeight):
+
+        self.framesSinceChange += 1
+        if self.framesSinceChange < self.cooldown:
+            return None
+
+        #step the ceiling down when over budget, back up once there is clear headroom
+        if self.frameTime is not None:
+            if self.frameTime > self.frameBudget and self.maxLevel > 0:
+                self.maxLevel -= 1
+                self.framesSinceChange = 0
+            elif self.frameTime < 0.75 * self.frameBudget and self.maxLevel < len(self.resolutions) - 1:
+                self.maxLevel += 1
+                self.framesSinceChange = 0
+
+        resolutions = []
+        for light in lights:
+            pixels = self.light_pixels(light, cameraPosition, projection, viewportHeight)
+            level = 0
+            while level < self.maxLevel and self.resolutions[level] < pixels:
+                level += 1
+            resolutions.append(self.resolutions[level])
+
+        if resolutions == self.current:
+            return None
+        self.current = resolutions
+        self.framesSinceChange = 0
+        return resolutions
+
+class DrawItem:
+
+
+    def __init__(self, name, mesh, material, program, twoSided = False, translucent = False, castsShadow = True, 
+                 materials = None):
+
+        #name of the scene component that places the item
+        self.name = name
+        self.mesh = mesh
+        self.material = material
+        #materials by usemtl name draw each submesh with its own texture, the rest with the item's material.
+        #without them every level is drawn whole
+        self.submeshMaterials = None
+        if materials:
+            self.submeshMaterials = [materials.get(submesh.material, material) for submesh in mesh.submeshes]
+        self.program = program
+        self.twoSided = twoSided
+        self.translucent = translucent
+        self.castsShadow = castsShadow
+
+    def sortKey(self):
+        #blended items last, then grouped so program, texture and vertex array change as rarely as possible
+        return (self.translucent, self.program.program, self.material.texture, self.mesh.vao)
+
+class RenderState:
+
+
+    def __init__(self):
+
+        self.reset()
+
+    def reset(self):
+        #forget everything bound, done once a frame since setup code binds behind the tracker's back
+        self.program = None
+        self.activeUnit = None
+        self.textures = {}
+        self.vertexArray = None
+        self.blending = None
+        self.uniforms = {}
+        self.changes = {"program": 0, "texture": 0, "vertexArray": 0, "blend": 0, "uniform": 0}
+        self.skipped = 0
+        self.drawCalls = 0
+        self.instancesDrawn = 0
+
+    def use_program(self, program):
+        if program is self.program:
+            self.skipped += 1
+            return
+        program.use()
+        self.program = program
+        self.changes["program"] += 1
+
+    def bind_texture(self, unit, target, texture):
+        #the unit is left active even when its texture is already bound, callers may copy into it next
+        if unit != self.activeUnit:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            self.activeUnit = unit
+        if self.textures.get(unit) == (target, texture):
+            self.skipped += 1
+            return
+        glBindTexture(target, texture)
+        self.textures[unit] = (target, texture)
+        self.changes["texture"] += 1
+
+    def bind_vertex_array(self, vao):
+        if vao == self.vertexArray:
+            self.skipped += 1
+            return
+        glBindVertexArray(vao)
+        self.vertexArray = vao
+        self.changes["vertexArray"] += 1
+
+    def set_blend(self, enabled):
+        if enabled == self.blending:
+            self.skipped += 1
+            return
+        if enabled:
+            glEnable(GL_BLEND)
+        else:
+            glDisable(GL_BLEND)
+        self.blending = enabled
+        self.changes["blend"] += 1
+
+    def set_uniform(self, program, name, value):
+        #program has to be in use
+        key = (program.program, name)
+        if self.uniforms.get(key) == value:
+            self.skipped += 1
+            return
+        program.set(name, value)
+        self.uniforms[key] = value
+        self.changes["uniform"] += 1
+
+    def state_changes(self):
+        return sum(self.changes.values())
+
+class FrameClock:
+
+
+    def __init__(self, step = SIMULATION_STEP, frameCap = FRAME_CAP):
+
+        self.step = step
+        self.frameCap = frameCap
+        self.lastTime = time.perf_counter()
+        #seconds since the previous tick, and simulated time not yet stepped through
+        self.delta = 0.0
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        #when the current frame may end, and how late time.sleep has been waking up
+        self.deadline = None
+        self.oversleep = SLEEP_SPIN_MARGIN
+
+    def tick(self):
+
+        now = time.perf_counter()
+        self.delta = min(now - self.lastTime, MAX_FRAME_DELTA)
+        self.lastTime = now
+        self.accumulator += self.delta
+
+    def steps(self):
+
+        #whole steps the time covers, the remainder carries over and sets how far to draw between steps
+        steps = int(self.accumulator // self.step)
+        self.accumulator -= steps * self.step
+        self.alpha = self.accumulator / self.step
+        return min(steps, MAX_SIMULATION_STEPS)
+
+    def limit(self):
+
+        if not self.frameCap:
+            return
+        #deadlines advance by whole periods so the rate does not drift, a frame that fell behind starts over
+        period = 1 / self.frameCap
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > period:
+            self.deadline = now
+        self.deadline += period
+
+        #sleep in short slices, then spin the last fraction of a millisecond, sleep wakes up late by a little
+        spin = min(self.oversleep, SLEEP_SPIN_LIMIT)
+        while True:
+            sliceStart = time.perf_counter()
+            sleepTime = min(SLEEP_SLICE, self.deadline - sliceStart - spin)
+            if sleepTime <= 0:
+                break
+            time.sleep(sleepTime)
+            late = time.perf_counter() - sliceStart - sleepTime
+            self.oversleep = max(SLEEP_SPIN_MARGIN, 0.9 * self.oversleep + 0.1 * late)
+        while time.perf_counter() < self.deadline:
+            pass
+
+class Tracer:
+
+
+    def __init__(self, enabled = False, maxEvents = TRACE_MAX_EVENTS):
+
+        #chrome trace events, timestamps in microseconds since the tracer was made
+        self.enabled = enabled
+        self.maxEvents = maxEvents
+        self.events = []
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        #thread ident -> small id, named in the trace's metadata
+        self.threads = {}
+        self.frameTimes = []
+        #handed out while disabled, so a span costs a call and an empty with block
+        self.nullSpan = nullcontext()
+
+    def span(self, name, **args):
+
+        if not self.enabled:
+            return self.nullSpan
+        return self.timed_span(name, args)
+
+    @contextmanager
+    def timed_span(self, name, args):
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), args)
+
+    def record(self, name, start, end, args = None):
+
+        #perf_counter seconds, for code that times itself anyway
+        if not self.enabled:
+            return
+        if len(self.events) >= self.maxEvents:
+            self.dropped += 1
+            return
+        event = {
+            "name": name, "ph": "X", "pid": self.pid, "tid": self.thread_id(),
+            "ts": 1e6 * (start - self.origin), "dur": 1e6 * (end - start),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def frame(self, start, end):
+
+        if not self.enabled:
+            return
+        self.record("frame", start, end)
+        self.frameTimes.append(end - start)
+        self.counter("frame time", end, {"ms": 1000 * (end - start)})
+
+    def counter(self, name, timestamp, values):
+
+        #one track per name, its values stacked, held from timestamp until the next event of that name
+        if not self.enabled or len(self.events) >= self.maxEvents:
+            return
+        self.events.append({
+            "name": name, "ph": "C", "pid": self.pid, "ts": 1e6 * (timestamp - self.origin), "args": values,
+        })
+
+    def thread_id(self):
+
+        ident = threading.get_ident()
+        if ident not in self.threads:
+            self.threads[ident] = (len(self.threads), threading.current_thread().name)
+        return self.threads[ident][0]
+
+    def histogram(self, edges = TRACE_HISTOGRAM_EDGES):
+
+        #frames per bucket, [low, high) in milliseconds, the last bucket has no upper edge
+        buckets = np.digitize(1000 * np.asarray(self.frameTimes), edges)
+        counts = np.bincount(buckets, minlength = len(edges) + 1)
+        highs = list(edges[1:]) + [None]
+        return [{"low": low, "high": high, "frames": int(count)} 
+                for low, high, count in zip(edges, highs, counts[1:])]
+
+    def write(self, path):
+
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.threads.values()
+        ]
+        trace = {
+            "traceEvents": names + self.events,
+            "displayTimeUnit": "ms",
+            "droppedEvents": self.dropped,
+            "frameTimeHistogram": self.histogram(),
+        }
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        if GAME_MODE == 0:
+            print(f"wrote {len(self.events)} trace events to {path}")
+            for bucket in trace["frameTimeHistogram"]:
+                high = f"{bucket['high']} ms" if bucket["high"] is not None else "up"
+                print(f"{bucket['low']} - {high}: {bucket['frames']} frames")
+
+class DebugLayer:
+
+
+    def __init__(self, errorInterval = DEBUG_ERROR_INTERVAL):
+
+        self.errorInterval = errorInterval
+        self.frame = 0
+        #messages per severity and per source, and how often each distinct message came in
+        self.severityCounts = {}
+        self.sourceCounts = {}
+        self.repeats = {}
+        #filled by the callback, which may run on a driver thread, emptied on this one
+        self.pending = deque()
+
+        self.useCallback = has_gl_extension("GL_KHR_debug") or has_gl_extension("GL_ARB_debug_output")
+        if self.useCallback:
+            #asynchronous output, the driver reports whenever it notices rather than stalling each call
+            self.callback = GLDEBUGPROC(self.receive)
+            glEnable(GL_DEBUG_OUTPUT)
+            glDisable(GL_DEBUG_OUTPUT_SYNCHRONOUS)
+            glDebugMessageCallback(self.callback, None)
+            for severity in DEBUG_SEVERITY_NAMES:
+                glDebugMessageControl(GL_DONT_CARE, GL_DONT_CARE, severity, 0, None, severity in DEBUG_SEVERITIES)
+        #errors come from the callback or the batched reads now, so PyOpenGL's per-call check is paused
+        #the way glBegin pauses it
+        if glErrorChecker:
+            glErrorChecker.onBegin()
+
+    def receive(self, source, messageType, messageId, severity, length, message, userParam):
+
+        self.pending.append((source, messageType, messageId, severity, 
+                             ctypes.string_at(message, length).decode(errors = "replace")))
+
+    def end_frame(self):
+
+        #glGetError waits on the driver, so without debug output errors are read in batches
+        self.frame += 1
+        if not self.useCallback and self.frame % self.errorInterval == 0:
+            self.check_errors()
+        while self.pending:
+            self.report(*self.pending.popleft())
+
+    def check_errors(self):
+
+        error = glGetError()
+        while error != GL_NO_ERROR:
+            name = GL_ERROR_NAMES.get(error, hex(error))
+            self.report(GL_DEBUG_SOURCE_API, GL_DEBUG_TYPE_ERROR, error, GL_DEBUG_SEVERITY_HIGH, 
+                        f"{name} in the last {self.errorInterval} frames")
+            error = glGetError()
+
+    def report(self, source, messageType, messageId, severity, message):
+
+        self.severityCounts[severity] = self.severityCounts.get(severity, 0) + 1
+        self.sourceCounts[source] = self.sourceCounts.get(source, 0) + 1
+        #a message that comes back every frame is printed the first time only
+        key = (source, messageType, messageId, message)
+        self.repeats[key] = self.repeats.get(key, 0) + 1
+        if self.repeats[key] == 1:
+            print(f"gl {DEBUG_SEVERITY_NAMES.get(severity, severity)} {DEBUG_TYPE_NAMES.get(messageType, messageType)} "
+                  f"from {DEBUG_SOURCE_NAMES.get(source, source)}: {message}")
+
+    def counts(self):
+
+        return {
+            "severity": {DEBUG_SEVERITY_NAMES.get(key, key): count for key, count in self.severityCounts.items()},
+            "source": {DEBUG_SOURCE_NAMES.get(key, key): count for key, count in self.sourceCounts.items()},
+        }
+
+    def destroy(self):
+
+        #whatever is still queued, then how often the repeated messages came back
+        if not self.useCallback:
+            self.check_errors()
+        self.end_frame()
+        if self.useCallback:
+            glDisable(GL_DEBUG_OUTPUT)
+            glDebugMessageCallback(GLDEBUGPROC(), None)
+            #errors the callback already reported stay flagged, cleared before PyOpenGL checks again
+            while glGetError() != GL_NO_ERROR:
+                pass
+        if glErrorChecker:
+            glErrorChecker.onEnd()
+        for (source, messageType, messageId, message), count in self.repeats.items():
+            if count > 1:
+                print(f"repeated {count} times: {message}")
+        if self.repeats:
+            print(f"gl messages: {self.counts()}")
+
+class GpuProfiler:
+
+
+    def __init__(self, passes = GPU_PROFILER_PASSES, latency = GPU_PROFILER_LATENCY, window = GPU_PROFILER_WINDOW):
+
+        #per frame in flight, a timestamp where each pass begins and one where the frame ends
+        self.passes = passes
+        self.passIndex = {name: i for i, name in enumerate(passes)}
+        self.latency = latency
+        self.queries = np.array(glGenQueries(latency * (len(passes) + 1)), dtype=np.uint32).reshape(latency, -1)
+        #passes that wrote their timestamp, a pass left out of a frame counts as zero
+        self.marked = np.zeros(self.queries.shape, dtype=bool)
+        #frame each slot holds timestamps for, -1 once read
+        self.slotFrames = np.full(latency, -1)
+        self.slot = 0
+        self.frame = 0
+        #milliseconds per pass of the last window frames read back
+        self.history = np.zeros((window, len(passes)))
+        self.readCount = 0
+        #(frame, {pass: milliseconds}) of the newest frame read back, and those not yet taken
+        self.latest = None
+        self.results = deque(maxlen = window)
+        #frames whose timestamps were still not ready when their slot came round again
+        self.dropped = 0
+
+    def begin_frame(self):
+
+        self.collect()
+        self.slot = self.frame % self.latency
+        if self.slotFrames[self.slot] >= 0:
+            #waiting would stall on the gpu, the frame goes unmeasured instead
+            self.dropped += 1
+            self.slotFrames[self.slot] = -1
+        self.marked[self.slot] = False
+
+    def begin_pass(self, name):
+
+        index = self.passIndex[name]
+        glQueryCounter(int(self.queries[self.slot, index]), GL_TIMESTAMP)
+        self.marked[self.slot, index] = True
+
+    def end_frame(self):
+
+        glQueryCounter(int(self.queries[self.slot, -1]), GL_TIMESTAMP)
+        self.marked[self.slot, -1] = True
+        self.slotFrames[self.slot] = self.frame
+        self.frame += 1
+
+    def collect(self):
+
+        #oldest first, timestamps finish in order so the first one not ready ends the search
+        for slot in np.argsort(self.slotFrames):
+            frame = self.slotFrames[slot]
+            if frame < 0:
+                continue
+            if not glGetQueryObjectiv(int(self.queries[slot, -1]), GL_QUERY_RESULT_AVAILABLE):
+                break
+            indices = np.flatnonzero(self.marked[slot])
+            stamps = [query_timestamp(self.queries[slot, i]) for i in indices]
+            milliseconds = np.zeros(len(self.passes))
+            for i, start, end in zip(indices, stamps, stamps[1:]):
+                milliseconds[i] = (end - start) / 1e6
+            self.slotFrames[slot] = -1
+
+            self.history[self.readCount % len(self.history)] = milliseconds
+            self.readCount += 1
+            self.latest = (int(frame), dict(zip(self.passes, milliseconds.tolist())))
+            self.results.append(self.latest)
+
+    def averages(self):
+
+        #rolling mean over the last window frames read back, milliseconds per pass
+        count = min(self.readCount, len(self.history))
+        if count == 0:
+            return dict.fromkeys(self.passes, 0.0)
+        return dict(zip(self.passes, self.history[:count].mean(axis = 0).tolist()))
+
+    def take_results(self):
+
+        results = list(self.results)
+        self.results.clear()
+        return results
+
+    def destroy(self):
+
+        glDeleteQueries(self.queries.size, self.queries.ravel())
 
 class Mesh:
 
 
-    def __init__(self, filename):
+    def __init__(self, filename, upload = True):
         # x, y, z, s, t, nx, ny, nz
-        self.vertices = self.loadMesh(filename)
+        self.vertices, self.indices, self.submeshes, self.bounds, self.lods = self.loadCached(filename)
         self.vertex_count = len(self.vertices)//8
-        self.vertices = np.array(self.vertices, dtype=np.float32)
+        #the full mesh, coarser levels follow it in the same index buffer
+        self.index_count = int(self.lods[0]["indexCount"])
+        #(first index, index count) of every submesh in every level
+        self.submeshLods = self.submeshRanges()
+        #bounding box as center and half extents, and the sphere around it, in model space
+        self.boundingCenter = self.bounds.mean(axis=0)
+        self.boundingExtents = (self.bounds[1] - self.bounds[0]) / 2
+        self.boundingRadius = float(np.linalg.norm(self.boundingExtents))
+        if self.indices.dtype == np.uint16:
+            self.index_type = GL_UNSIGNED_SHORT
+        else:
+            self.index_type = GL_UNSIGNED_INT
+
+        #loading touches no gl state, so it may run off the context thread
+        if upload:
+            self.upload()
+
+    def upload(self):
 
         self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
         
         self.vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
         glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
 
-        glBindVertexArray(self.vao)
+        #element buffer binding is recorded in the vao
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+
         #position
         glEnableVertexAttribArray(0)
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(0))
@@ -756,104 +3008,476 @@ class Mesh:
         #normal
         glEnableVertexAttribArray(2)
         glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, 32, ctypes.c_void_p(20))
+
+        #per-instance model and model-view-projection matrices, one vec4 column per location
+        self.instance_vbo = glGenBuffers(1)
+        self.instance_capacity = 0
+        self.instance_key = None
+        self.instance_offset = 0
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        for column in range(8):
+            glEnableVertexAttribArray(3 + column)
+            glVertexAttribPointer(3 + column, 4, GL_FLOAT, GL_FALSE, INSTANCE_DATA.itemsize, 
+                                  ctypes.c_void_p(16 * column))
+            glVertexAttribDivisor(3 + column, 1)
         glBindBuffer(GL_ARRAY_BUFFER, 0)
         glBindVertexArray(0)
+
+    def set_instances(self, instances):
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        if len(instances) > self.instance_capacity:
+            glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+            self.instance_capacity = len(instances)
+        else:
+            glBufferSubData(GL_ARRAY_BUFFER, 0, instances.nbytes, instances)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def set_instance_offset(self, first):
+
+        #stands in for a base instance, the per-instance attributes start at the first instance to draw
+        if first == self.instance_offset:
+            return
+        self.instance_offset = first
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        for column in range(8):
+            glVertexAttribPointer(3 + column, 4, GL_FLOAT, GL_FALSE, INSTANCE_DATA.itemsize, 
+                                  ctypes.c_void_p(INSTANCE_DATA.itemsize * first + 16 * column))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def loadCached(self, filename):
+
+        start = time.perf_counter()
+        cachePath = filename + MESH_CACHE_EXTENSION
+        sourceStat = os.stat(filename)
+
+        header = read_cache_header(cachePath, MESH_CACHE_HEADER, b"MESH", MESH_CACHE_VERSION)
+        if header is not None and self.cacheIsFresh(header, cachePath, filename, sourceStat):
+            vertexCount = int(header["vertexCount"])
+            indexCount = int(header["indexCount"])
+            indexType = np.uint16 if header["indexSize"] == 2 else np.uint32
+            submeshCount = int(header["submeshCount"])
+            submeshes = [
+                Submesh(
+                    entry["objectName"].decode(), entry["material"].decode(),
+                    int(entry["firstIndex"]), int(entry["indexCount"])
+                )
+                for entry in np.fromfile(
+                    cachePath, dtype=MESH_CACHE_SUBMESH, count=submeshCount,
+                    offset=MESH_CACHE_HEADER.itemsize
+                )
+            ]
+            lodCount = int(header["lodCount"])
+            offset = MESH_CACHE_HEADER.itemsize + submeshCount * MESH_CACHE_SUBMESH.itemsize
+            lods = np.fromfile(cachePath, dtype=MESH_CACHE_LOD, count=lodCount, offset=offset)
+            #mapped straight from the file, glBufferData reads the pages directly
+            offset += lodCount * MESH_CACHE_LOD.itemsize
+            vertices = map_cache(cachePath, np.float32, offset, vertexCount * 8)
+            indices = map_cache(cachePath, indexType, offset + vertexCount * 32, indexCount)
+            if GAME_MODE == 0:
+                print(f"{filename}: mapped {vertexCount} vertices, {indexCount} indices from cache "
+                      f"in {1000 * (time.perf_counter() - start):.1f} ms")
+            return vertices, indices, submeshes, header["bounds"].copy(), lods
+
+        #missing or stale, parse the source and rebuild the cache
+        vertices, indices, submeshes = self.loadMesh(filename)
+        indices, lods = self.buildLods(filename, vertices, indices, submeshes)
+        positions = vertices.reshape(-1, 8)[:,0:3]
+        if len(positions) > 0:
+            bounds = np.array([positions.min(axis=0), positions.max(axis=0)], dtype=np.float32)
+        else:
+            bounds = np.zeros((2, 3), dtype=np.float32)
+        self.writeCache(cachePath, filename, sourceStat, vertices, indices, submeshes, bounds, lods)
+        return vertices, indices, submeshes, bounds, lods
+
+    def buildLods(self, filename, vertices, indices, submeshes):
+
+        start = time.perf_counter()
+        levels = build_lods(vertices, indices, LOD_REDUCTION, LOD_LEVELS, LOD_MAX_TRIANGLES)
+        table = np.zeros(len(levels), dtype=MESH_CACHE_LOD)
+        firstIndex = 0
+        for entry, (triangles, error) in zip(table, levels):
+            entry["firstIndex"] = firstIndex
+            entry["indexCount"] = triangles.size
+            entry["error"] = error
+            firstIndex += triangles.size
+
+        #coarser levels go after the full mesh, so the submesh ranges still hold. their triangles are grouped
+        #in submesh order, so each submesh of a level is one range too
+        if len(levels) > 1:
+            starts = submesh_vertex_starts(indices, submeshes)
+            coarser = []
+            for triangles, error in levels[1:]:
+                owners = np.searchsorted(starts, triangles[:, 0], side = "right")
+                coarser.append(triangles[np.argsort(owners, kind = "stable")].ravel().astype(indices.dtype))
+            indices = np.concatenate([indices] + coarser)
+        if GAME_MODE == 0 and table["indexCount"][0] > 3 * LOD_MAX_TRIANGLES:
+            print(f"{filename}: {table['indexCount'][0] // 3} triangles is over LOD_MAX_TRIANGLES, no levels of detail built")
+        elif GAME_MODE == 0:
+            print(f"{filename}: built {len(levels) - 1} levels of detail "
+                  f"({', '.join(str(int(count) // 3) for count in table['indexCount'])} triangles) "
+                  f"in {1000 * (time.perf_counter() - start):.1f} ms")
+        return indices, table
+
+    def submeshRanges(self):
+
+        ranges = np.zeros((len(self.lods), len(self.submeshes), 2), dtype=np.int64)
+        if len(self.submeshes) == 1:
+            ranges[:, 0, 0] = self.lods["firstIndex"]
+            ranges[:, 0, 1] = self.lods["indexCount"]
+            return ranges
+        starts = submesh_vertex_starts(self.indices, self.submeshes)
+        for level, lod in enumerate(self.lods):
+            first, count = int(lod["firstIndex"]), int(lod["indexCount"])
+            owners = np.searchsorted(starts, self.indices[first:first + count:3], side = "right") - 1
+            counts = 3 * np.bincount(owners, minlength = len(starts))
+            ranges[level, :, 0] = first + np.cumsum(counts) - counts
+            ranges[level, :, 1] = counts
+        return ranges
+
+    def cacheIsFresh(self, header, cachePath, filename, sourceStat):
+
+        if (header["lodReduction"], header["lodLevels"], header["lodMaxTriangles"]) \
+            != (LOD_REDUCTION, LOD_LEVELS, LOD_MAX_TRIANGLES):
+            return False
+        #a truncated or partially written cache is never trusted
+        expectedSize = MESH_CACHE_HEADER.itemsize \
+            + int(header["submeshCount"]) * MESH_CACHE_SUBMESH.itemsize \
+            + int(header["lodCount"]) * MESH_CACHE_LOD.itemsize \
+            + int(header["vertexCount"]) * 32 \
+            + int(header["indexCount"]) * int(header["indexSize"])
+        return cache_is_fresh(header, cachePath, expectedSize, filename, sourceStat)
+
+    def writeCache(self, cachePath, filename, sourceStat, vertices, indices, submeshes, bounds, lods):
+
+        header = create_cache_header(MESH_CACHE_HEADER, b"MESH", MESH_CACHE_VERSION, filename, sourceStat)
+        header["vertexCount"] = len(vertices) // 8
+        header["indexCount"] = len(indices)
+        header["indexSize"] = indices.itemsize
+        header["submeshCount"] = len(submeshes)
+        header["lodCount"] = len(lods)
+        header["lodReduction"] = LOD_REDUCTION
+        header["lodLevels"] = LOD_LEVELS
+        header["lodMaxTriangles"] = LOD_MAX_TRIANGLES
+        header["bounds"] = bounds
+
+        table = np.zeros(len(submeshes), dtype=MESH_CACHE_SUBMESH)
+        for entry, submesh in zip(table, submeshes):
+            entry["objectName"] = submesh.object_name.encode()[:64]
+            entry["material"] = submesh.material.encode()[:64]
+            entry["firstIndex"] = submesh.first_index
+            entry["indexCount"] = submesh.index_count
+
+        write_cache(cachePath, (header, table, lods, vertices, indices))
     
     def loadMesh(self, filename):
 
+        start = time.perf_counter()
+
+        #first pass only counts records so every buffer below is allocated once
+        vertexCount, texCoordCount, normalCount, cornerCount = self.countRecords(filename)
+
         #raw, unassembled data
-        v = []
-        vt = []
-        vn = []
-        
+        v = np.empty((vertexCount, 3), dtype=np.float32)
+        vt = np.empty((texCoordCount, 2), dtype=np.float32)
+        vn = np.empty((normalCount, 3), dtype=np.float32)
+        #faces are deduplicated a chunk at a time as they stream in: indices first point into
+        #candidates, the distinct v/vt/vn keys of each chunk in order of first use
+        indices = np.empty(cornerCount, dtype=np.uint32)
+        candidates = []
+        candidateCount = 0
+        filled = {"v": 0, "vt": 0, "vn": 0, "f": 0}
+        raw = {"v": v, "vt": vt, "vn": vn}
+
+        #submeshes start whenever o or usemtl changes, as [object, material, first corner, first candidate]
+        submeshes = [["", "", 0, 0]]
+
+        for flag, data in self.streamRecords(filename):
+            if flag == "o" or flag == "usemtl":
+                current = submeshes[-1]
+                if current[2] != filled["f"]:
+                    current = [current[0], current[1], filled["f"], candidateCount]
+                    submeshes.append(current)
+                current[0 if flag == "o" else 1] = data
+                continue
+            if flag == "f":
+                keys = (data[:,0] * texCoordCount + data[:,1]) * normalCount + data[:,2]
+                distinct, cornerToDistinct = self.numberByFirstUse(keys)
+                indices[filled["f"]:filled["f"] + len(keys)] = cornerToDistinct + candidateCount
+                candidates.append(distinct)
+                candidateCount += len(distinct)
+                filled["f"] += len(keys)
+                continue
+            raw[flag][filled[flag]:filled[flag] + len(data)] = data
+            filled[flag] += len(data)
+        candidates = np.concatenate(candidates) if candidates else np.zeros(0, dtype=np.int64)
+
+        ends = [s[2:4] for s in submeshes[1:]] + [[cornerCount, candidateCount]]
+        submeshes = [
+            (Submesh(objectName, material, first, end - first), firstCandidate, endCandidate)
+            for (objectName, material, first, firstCandidate), (end, endCandidate)
+            in zip(submeshes, ends)
+            if end > first
+        ]
+
+        #each distinct v/vt/vn corner of a submesh becomes one vertex, numbered in order of first use.
+        #chunks follow file order, so first use among the candidates is first use among the corners
+        uniqueKeys = []
+        vertexBase = 0
+        for submesh, firstCandidate, endCandidate in submeshes:
+            distinct, candidateToVertex = self.numberByFirstUse(candidates[firstCandidate:endCandidate])
+            candidateToVertex = (candidateToVertex + vertexBase).astype(np.uint32)
+            corners = indices[submesh.first_index:submesh.first_index + submesh.index_count]
+            corners[:] = candidateToVertex[corners - firstCandidate]
+            uniqueKeys.append(distinct)
+            vertexBase += len(distinct)
+        submeshes = [submesh for submesh, _, _ in submeshes]
+        del candidates
+
         #final, assembled and packed result
-        vertices = []
-
-        #open the obj file and read the data
-        with open(filename,'r') as f:
-            line = f.readline()
-            while line:
-                firstSpace = line.find(" ")
-                flag = line[0:firstSpace]
-                if flag=="v":
-                    #vertex
-                    line = line.replace("v ","")
-                    line = line.split(" ")
-                    l = [float(x) for x in line]
-                    v.append(l)
-                elif flag=="vt":
-                    #texture coordinate
-                    line = line.replace("vt ","")
-                    line = line.split(" ")
-                    l = [float(x) for x in line]
-                    vt.append(l)
-                elif flag=="vn":
-                    #normal
-                    line = line.replace("vn ","")
-                    line = line.split(" ")
-                    l = [float(x) for x in line]
-                    vn.append(l)
-                elif flag=="f":
-                    #face, three or more vertices in v/vt/vn form
-                    line = line.replace("f ","")
-                    line = line.replace("\n","")
-                    #get the individual vertices for each line
-                    line = line.split(" ")
-                    faceVertices = []
-                    faceTextures = []
-                    faceNormals = []
-                    for vertex in line:
-                        #break out into [v,vt,vn],
-                        #correct for 0 based indexing.
-                        l = vertex.split("/")
-                        position = int(l[0]) - 1
-                        faceVertices.append(v[position])
-                        texture = int(l[1]) - 1
-                        faceTextures.append(vt[texture])
-                        normal = int(l[2]) - 1
-                        faceNormals.append(vn[normal])
-                    # obj file uses triangle fan format for each face individually.
-                    # unpack each face
-                    triangles_in_face = len(line) - 2
-
-                    vertex_order = []
-                    """
-                        eg. 0,1,2,3 unpacks to vertices: [0,1,2,0,2,3]
-                    """
-                    for i in range(triangles_in_face):
-                        vertex_order.append(0)
-                        vertex_order.append(i+1)
-                        vertex_order.append(i+2)
-                    for i in vertex_order:
-                        for x in faceVertices[i]:
-                            vertices.append(x)
-                        for x in faceTextures[i]:
-                            vertices.append(x)
-                        for x in faceNormals[i]:
-                            vertices.append(x)
-                line = f.readline()
-        return vertices
-    
+        vertices = np.empty((vertexBase, 8), dtype=np.float32)
+        vertexBase = 0
+        for distinct in uniqueKeys:
+            position, remainder = np.divmod(distinct, texCoordCount * normalCount)
+            texture, normal = np.divmod(remainder, normalCount)
+            block = vertices[vertexBase:vertexBase + len(distinct)]
+            block[:,0:3] = v[position]
+            block[:,3:5] = vt[texture]
+            block[:,5:8] = vn[normal]
+            vertexBase += len(distinct)
+        vertices = vertices.ravel()
+        if vertexBase <= 0xFFFF:
+            indices = indices.astype(np.uint16)
+
+        self.parseTime = time.perf_counter() - start
+        if GAME_MODE == 0:
+            megabytes = os.path.getsize(filename) / (1024 * 1024)
+            print(f"{filename}: parsed {1024 * megabytes:.0f} KB in {1000 * self.parseTime:.1f} ms "
+                  f"({megabytes / max(self.parseTime, 1e-9):.1f} MB/s, "
+                  f"{len(indices) / max(self.parseTime, 1e-9):.0f} vertices/s, "
+                  f"{len(vertices) // 8} unique of {len(indices)}, {len(submeshes)} submeshes)")
+
+        return vertices, indices, submeshes
+
+    def numberByFirstUse(self, keys):
+
+        #the distinct keys in order of first use, and the position of every key among them
+        distinct, firstUse, keyToDistinct = np.unique(keys, return_index = True, return_inverse = True)
+        useOrder = np.argsort(firstUse)
+        distinctToUse = np.empty_like(useOrder)
+        distinctToUse[useOrder] = np.arange(len(useOrder))
+        return distinct[useOrder], distinctToUse[keyToDistinct.ravel()]
+
+    def readChunks(self, filename):
+
+        #yields blocks of whole lines, each starting with a newline so every
+        #record can be matched by its "\n<flag> " prefix
+        with open(filename, "rb") as f:
+            carry = b""
+            while True:
+                chunk = f.read(OBJ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunk = carry + chunk
+                lastLine = chunk.rfind(b"\n")
+                if lastLine < 0:
+                    carry = chunk
+                    continue
+                carry = chunk[lastLine + 1:]
+                yield "\n" + chunk[:lastLine + 1].decode("utf-8", "replace")
+            if carry:
+                yield "\n" + carry.decode("utf-8", "replace") + "\n"
+
+    def countRecords(self, filename):
+
+        vertexCount = texCoordCount = normalCount = cornerCount = 0
+        for text in self.readChunks(filename):
+            vertexCount += text.count("\nv ")
+            texCoordCount += text.count("\nvt ")
+            normalCount += text.count("\nvn ")
+            faces = re.findall(r"\nf +([^\n]*\S)", text)
+            #a face of n corners fans out into n - 2 triangles
+            faceCorners = " ".join(faces).count(" ") + 1 if faces else 0
+            cornerCount += 3 * (faceCorners - 2 * len(faces))
+        return vertexCount, texCoordCount, normalCount, cornerCount
+
+    def streamRecords(self, filename):
+
+        #yields ("v"|"vt"|"vn", rows), ("f", triangle corners) and ("o"|"usemtl", name)
+        #in file order, one chunk at a time
+        for text in self.readChunks(filename):
+            segments = re.split(r"\n(o|usemtl) +([^\n]*)", text)
+            for i in range(0, len(segments), 3):
+                if i > 0:
+                    yield segments[i - 2], segments[i - 1].strip()
+                segment = "\n" + segments[i]
+                for flag, width in (("v", 3), ("vt", 2), ("vn", 3)):
+                    rows = self.parseRecords(segment, flag, width)
+                    if len(rows) > 0:
+                        yield flag, rows
+                corners = self.parseFaces(segment)
+                if len(corners) > 0:
+                    yield "f", corners
+
+    def parseFaces(self, text):
+
+        #faces, three or more vertices in v/vt/vn form
+        faces = re.findall(r"\nf +([^\n]*\S)", text)
+        if not faces:
+            return np.zeros((0, 3), dtype=np.int64)
+        faceText = "\n".join(faces)
+        corners = np.fromstring(faceText.replace("/", " "), dtype=np.int64, sep=" ").reshape(-1, 3)
+        #correct for 0 based indexing.
+        corners -= 1
+
+        #corners per face, counted from the separators between them
+        characters = np.frombuffer(faceText.encode(), dtype=np.uint8)
+        faceEnds = np.append(np.flatnonzero(characters == ord("\n")), len(characters))
+        separatorsBefore = np.searchsorted(np.flatnonzero(characters == ord(" ")), faceEnds)
+        cornersPerFace = np.diff(separatorsBefore, prepend = 0) + 1
+
+        # obj file uses triangle fan format for each face individually.
+        # unpack every face at once
+        """
+            eg. 0,1,2,3 unpacks to vertices: [0,1,2,0,2,3]
+        """
+        trianglesPerFace = cornersPerFace - 2
+        firstCorner = np.cumsum(cornersPerFace) - cornersPerFace
+        firstTriangle = np.cumsum(trianglesPerFace) - trianglesPerFace
+        faceOfTriangle = np.repeat(np.arange(len(faces)), trianglesPerFace)
+        fanIndex = np.arange(faceOfTriangle.size) - firstTriangle[faceOfTriangle]
+        fanStart = firstCorner[faceOfTriangle]
+        vertex_order = np.stack(
+            (fanStart, fanStart + fanIndex + 1, fanStart + fanIndex + 2), axis = 1
+        ).ravel()
+        return corners[vertex_order]
+
+    def parseRecords(self, text, flag, width):
+
+        #gather the first (width) numbers of every "flag" line and convert them in one call
+        pattern = "\n" + flag + r" +(\S+" + r" +\S+" * (width - 1) + ")"
+        records = re.findall(pattern, text)
+        return np.fromstring(" ".join(records), dtype=np.float64, sep=" ").reshape(-1, width)
+
     def destroy(self):
         glDeleteVertexArrays(1, (self.vao,))
-        glDeleteBuffers(1,(self.vbo,))
+        glDeleteBuffers(3,(self.vbo, self.ebo, self.instance_vbo))
+
+class Submesh:
+
+
+    def __init__(self, object_name, material, first_index, index_count):
+        #a run of faces sharing one o/usemtl pair, as a range of the mesh's index buffer
+        self.object_name = object_name
+        self.material = material
+        self.first_index = first_index
+        self.index_count = index_count
 
 class Material:
 
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, upload = True, compression = None):
+        #decoding touches no gl state, so it may run off the context thread
+        #(width, height, texel bytes) per mip level, base level first
+        self.format, self.levels = self.loadCached(filepath, compression)
+        self.image_width,self.image_height = self.levels[0][0:2]
+        #bytes the texture occupies on the gpu, against the same mip chain as plain RGBA
+        self.gpu_bytes = sum(len(data) for _, _, data in self.levels)
+        self.rgba_bytes = sum(4 * width * height for width, height, _ in self.levels)
+        if GAME_MODE == 0 and self.format != "RGBA":
+            print(f"{filepath}: {self.format} {self.gpu_bytes // 1024} KB instead of "
+                  f"{self.rgba_bytes // 1024} KB, saves {(self.rgba_bytes - self.gpu_bytes) // 1024} KB")
+        if upload:
+            self.upload()
+
+    def loadCached(self, filepath, compression):
+
+        start = time.perf_counter()
+        #one cache per requested format, so switching formats never thrashes
+        suffix = "" if compression is None else "." + compression.lower()
+        cachePath = filepath + suffix + TEXTURE_CACHE_EXTENSION
+        sourceStat = os.stat(filepath)
+
+        header = read_cache_header(cachePath, TEXTURE_CACHE_HEADER, b"TEXR", TEXTURE_CACHE_VERSION)
+        if header is not None:
+            textureFormat = header["format"].decode()
+            sizes = self.mipSizes(int(header["width"]), int(header["height"]))
+            levelSizes = [compressed_size(textureFormat, width, height) for width, height in sizes]
+            payloadSize = sum(levelSizes)
+            if cache_is_fresh(header, cachePath, TEXTURE_CACHE_HEADER.itemsize + payloadSize,
+                              filepath, sourceStat):
+                #every level is a view of one mapping, the upload reads the pages directly
+                payload = map_cache(cachePath, np.uint8, TEXTURE_CACHE_HEADER.itemsize, payloadSize)
+                levels = []
+                offset = 0
+                for (width, height), size in zip(sizes, levelSizes):
+                    levels.append((width, height, payload[offset:offset + size]))
+                    offset += size
+                if GAME_MODE == 0:
+                    print(f"{filepath}: mapped {len(levels)} {textureFormat} mip levels from cache "
+                          f"in {1000 * (time.perf_counter() - start):.1f} ms")
+                return textureFormat, levels
+
+        #missing or stale, decode the source and rebuild the cache
+        levels = self.decodeImage(filepath)
+        textureFormat = "RGBA" if compression is None else compression
+        if textureFormat == "auto":
+            textureFormat = "BC3" if (levels[0][2][3::4] < 255).any() else "BC1"
+        if textureFormat != "RGBA":
+            levels = [
+                (width, height, compress_texture(data, width, height, textureFormat))
+                for width, height, data in levels
+            ]
+        header = create_cache_header(
+            TEXTURE_CACHE_HEADER, b"TEXR", TEXTURE_CACHE_VERSION, filepath, sourceStat
+        )
+        header["width"], header["height"] = levels[0][0:2]
+        header["format"] = textureFormat
+        write_cache(cachePath, [header] + [data for _, _, data in levels])
+        if GAME_MODE == 0:
+            print(f"{filepath}: decoded {len(levels)} {textureFormat} mip levels "
+                  f"in {1000 * (time.perf_counter() - start):.1f} ms")
+        return textureFormat, levels
+
+    def mipSizes(self, width, height):
+
+        #each level halves, rounding down, until both sides reach 1
+        sizes = [(width, height)]
+        while width > 1 or height > 1:
+            width = max(1, width // 2)
+            height = max(1, height // 2)
+            sizes.append((width, height))
+        return sizes
+
+    def decodeImage(self, filepath):
+
+        levels = []
+        with Image.open(filepath, mode = "r") as img:
+            img = img.convert("RGBA")
+            for width, height in self.mipSizes(*img.size):
+                #box filter each level from the one above, as glGenerateMipmap would
+                if img.size != (width, height):
+                    img = img.resize((width, height), Image.BOX)
+                levels.append((width, height, np.asarray(img).ravel()))
+        return levels
+
+    def upload(self):
         self.texture = glGenTextures(1)
         glBindTexture(GL_TEXTURE_2D, self.texture)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST_MIPMAP_LINEAR)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        with Image.open(filepath, mode = "r") as img:
-            image_width,image_height = img.size
-            img = img.convert("RGBA")
-            img_data = bytes(img.tobytes())
-            glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA,image_width,image_height,0,GL_RGBA,GL_UNSIGNED_BYTE,img_data)
-        glGenerateMipmap(GL_TEXTURE_2D)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(self.levels) - 1)
+        for level, (width, height, data) in enumerate(self.levels):
+            if self.format == "BC1":
+                glCompressedTexImage2D(GL_TEXTURE_2D,level,GL_COMPRESSED_RGB_S3TC_DXT1_EXT,width,height,0,data)
+            elif self.format == "BC3":
+                glCompressedTexImage2D(GL_TEXTURE_2D,level,GL_COMPRESSED_RGBA_S3TC_DXT5_EXT,width,height,0,data)
+            else:
+                glTexImage2D(GL_TEXTURE_2D,level,GL_RGBA,width,height,0,GL_RGBA,GL_UNSIGNED_BYTE,data)
+        #the driver has its own copy now
+        self.levels = None
 
     def use(self):
         glActiveTexture(GL_TEXTURE0)
@@ -862,5 +3486,109 @@ class Material:
     def destroy(self):
         glDeleteTextures(1, (self.texture,))
 
-window = initialize_glfw()
-myApp = App(window)
\ No newline at end of file
+class AssetLoader:
+
+
+    def __init__(self, workers = None, textureCompression = None, tracer = None):
+        #name -> (asset class, path, constructor options)
+        self.jobs = {}
+        self.workers = workers or os.cpu_count() or 1
+        self.textureCompression = textureCompression
+        self.tracer = tracer or Tracer()
+        #name -> [seconds spent loading on a worker, seconds spent uploading]
+        self.timings = {}
+
+    def add_mesh(self, name, filename):
+        self.jobs[name] = (Mesh, filename, {})
+
+    def add_material(self, name, filepath):
+        self.jobs[name] = (Material, filepath, {"compression": self.textureCompression})
+
+    def load(self):
+
+        start = time.perf_counter()
+        assets = {}
+        #PIL decoding and file reads release the GIL, so threads overlap well and
+        #hand back results without pickling. gl calls stay on this thread.
+        with ThreadPoolExecutor(max_workers = min(self.workers, max(1, len(self.jobs)))) as pool:
+            futures = {
+                pool.submit(self.loadOne, assetType, path, options): name
+                for name, (assetType, path, options) in self.jobs.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                asset, loadTime = future.result()
+                uploadStart = time.perf_counter()
+                asset.upload()
+                uploadEnd = time.perf_counter()
+                self.tracer.record(f"upload {name}", uploadStart, uploadEnd)
+                self.timings[name] = [loadTime, uploadEnd - uploadStart]
+                assets[name] = asset
+        end = time.perf_counter()
+        self.tracer.record("load assets", start, end, {"assets": len(assets)})
+        self.totalTime = end - start
+
+        if GAME_MODE == 0:
+            for name, (loadTime, uploadTime) in self.timings.items():
+                print(f"asset {name}: load {1000 * loadTime:.1f} ms, upload {1000 * uploadTime:.1f} ms")
+            serialTime = sum(sum(timing) for timing in self.timings.values())
+            print(f"loaded {len(assets)} assets in {1000 * self.totalTime:.1f} ms "
+                  f"({1000 * serialTime:.1f} ms of work)")
+        return assets
+
+    def loadOne(self, assetType, path, options):
+
+        start = time.perf_counter()
+        asset = assetType(path, upload = False, **options)
+        end = time.perf_counter()
+        #worker threads get their own rows in the trace
+        self.tracer.record(f"load {path}", start, end)
+        return asset, end - start
+
+#the tests import this file for its classes, only running it as a script opens anything
+if __name__ == "__main__":
+    arguments = command_line_arguments()
+    tracer = Tracer(enabled = arguments.trace is not None)
+    exitStatus = 0
+    if arguments.benchmark:
+        benchmark = Benchmark(tracer = tracer)
+        results = benchmark.run()
+        benchmark.quit()
+        if arguments.results is not None:
+            with open(arguments.results, "w") as f:
+                json.dump(results, f, indent = 2)
+        else:
+            print(json.dumps(results, indent = 2))
+
+        regressions = []
+        if arguments.baseline is not None:
+            if arguments.update_baseline or not os.path.exists(arguments.baseline):
+                with open(arguments.baseline, "w") as f:
+                    json.dump(results, f, indent = 2)
+                print(f"wrote baseline {arguments.baseline}")
+            else:
+                with open(arguments.baseline) as f:
+                    baseline = json.load(f)
+                if baseline["renderer"] != results["renderer"]:
+                    print(f"baseline was recorded on {baseline['renderer']}, this run is on {results['renderer']}")
+                regressions = compare_benchmark(results, baseline, arguments.threshold)
+                for regression in regressions:
+                    print(f"regression: {regression}")
+                print(f"{len(regressions)} regressions against {arguments.baseline}")
+        exitStatus = 1 if regressions else 0
+    elif HEADLESS:
+        cameraScript = None
+        if arguments.camera is not None:
+            with open(arguments.camera) as f:
+                cameraScript = json.load(f)
+        headlessApp = HeadlessApp(tracer)
+        frames = headlessApp.run(arguments.frames, cameraScript, arguments.output)
+        headlessApp.quit()
+        print(f"rendered {len(frames)} frames")
+    else:
+        window = initialize_glfw()
+        myApp = App(window, tracer, arguments.fps_cap)
+
+    if tracer.enabled:
+        tracer.write(arguments.trace)
+    sys.exit(exitStatus)
\ No newline at end of file
@@ -0,0 +1,27 @@
+import importlib.util
+import os
+import pathlib
+
+import pytest
+
+#the scripts settle on an OpenGL platform when imported, EGL lets the tests that draw run without a window
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+SCRIPTS = ("depth buffer shadows.py", "color buffer shadows.py")
+
+
+def load_script(filename):
+
+    #the file names have spaces in them, so they are loaded by path rather than imported
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace(" ", "_"), ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope = "session", params = SCRIPTS)
+def shadows(request):
+
+    return load_script(request.param)
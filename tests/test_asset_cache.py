@@ -0,0 +1,174 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def model(tmp_path):
+
+    path = tmp_path / "shade_smooth.obj"
+    shutil.copy(ROOT / "models" / "shade_smooth.obj", path)
+    return str(path)
+
+
+@pytest.fixture
+def image(tmp_path):
+
+    path = tmp_path / "noise.png"
+    pixels = np.random.default_rng(7).integers(0, 256, (40, 24, 4), dtype=np.uint8)
+    Image.fromarray(pixels, "RGBA").save(path)
+    return str(path)
+
+
+def forbid(monkeypatch, cls, method):
+
+    #a cache hit never reaches the parser or decoder
+    def fail(*args, **kwargs):
+        raise AssertionError(f"{cls.__name__}.{method} ran instead of reading the cache")
+    monkeypatch.setattr(cls, method, fail)
+
+
+def rewrite(path, change):
+
+    #a later mtime, so the cache cannot be trusted on the timestamp alone
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        change(data)
+        f.seek(0)
+        f.write(data)
+        f.truncate()
+    stat = os.stat(path)
+    os.utime(path, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def assert_same_mesh(first, second):
+
+    assert np.array_equal(first.vertices, second.vertices)
+    assert first.indices.dtype == second.indices.dtype
+    assert np.array_equal(first.indices, second.indices)
+    assert np.array_equal(first.bounds, second.bounds)
+    assert np.array_equal(first.lods, second.lods)
+    assert [(s.object_name, s.material, s.first_index, s.index_count) for s in first.submeshes] \
+        == [(s.object_name, s.material, s.first_index, s.index_count) for s in second.submeshes]
+
+
+def test_mesh_cache_round_trip(shadows, model, monkeypatch):
+
+    parsed = shadows.Mesh(model, upload = False)
+    assert os.path.exists(model + shadows.MESH_CACHE_EXTENSION)
+
+    forbid(monkeypatch, shadows.Mesh, "loadMesh")
+    assert_same_mesh(parsed, shadows.Mesh(model, upload = False))
+
+
+def test_mesh_cache_survives_touch(shadows, model, monkeypatch):
+
+    shadows.Mesh(model, upload = False)
+    rewrite(model, lambda data: None)
+
+    forbid(monkeypatch, shadows.Mesh, "loadMesh")
+    shadows.Mesh(model, upload = False)
+    #the matching hash refreshed the stored mtime, so the next load skips hashing
+    forbid(monkeypatch, shadows, "hash_file")
+    shadows.Mesh(model, upload = False)
+
+
+def test_mesh_cache_invalidated_by_same_size_edit(shadows, model):
+
+    cached = shadows.Mesh(model, upload = False)
+
+    def moveFirstVertex(data):
+        start = data.index(b"\nv ") + 3
+        data[start:start + 1] = b"7" if data[start:start + 1] != b"7" else b"8"
+    rewrite(model, moveFirstVertex)
+
+    reparsed = shadows.Mesh(model, upload = False)
+    assert not np.array_equal(cached.vertices, reparsed.vertices)
+    assert_same_mesh(reparsed, shadows.Mesh(model, upload = False))
+
+
+def test_mesh_cache_invalidated_by_resize(shadows, model, monkeypatch):
+
+    shadows.Mesh(model, upload = False)
+    with open(model, "a") as f:
+        f.write("f 1/1/1 2/2/2 3/3/3\n")
+
+    parsed = []
+    loadMesh = shadows.Mesh.loadMesh
+    monkeypatch.setattr(shadows.Mesh, "loadMesh", lambda self, filename: parsed.append(filename) or loadMesh(self, filename))
+    shadows.Mesh(model, upload = False)
+    assert parsed == [model]
+
+
+def test_truncated_mesh_cache_is_rebuilt(shadows, model):
+
+    cached = shadows.Mesh(model, upload = False)
+    cachePath = model + shadows.MESH_CACHE_EXTENSION
+    with open(cachePath, "r+b") as f:
+        f.truncate(os.path.getsize(cachePath) - 4)
+
+    assert_same_mesh(cached, shadows.Mesh(model, upload = False))
+    assert os.path.getsize(cachePath) > 0
+    assert_same_mesh(cached, shadows.Mesh(model, upload = False))
+
+
+@pytest.mark.parametrize("compression", [None, "BC1", "BC3"])
+def test_texture_cache_round_trip(shadows, image, compression, monkeypatch):
+
+    decoded = shadows.Material(image, upload = False, compression = compression)
+    suffix = "" if compression is None else "." + compression.lower()
+    assert os.path.exists(image + suffix + shadows.TEXTURE_CACHE_EXTENSION)
+
+    forbid(monkeypatch, shadows.Material, "decodeImage")
+    cached = shadows.Material(image, upload = False, compression = compression)
+    assert cached.format == decoded.format == (compression or "RGBA")
+    assert len(cached.levels) == len(decoded.levels)
+    for (width, height, data), (cachedWidth, cachedHeight, cachedData) in zip(decoded.levels, cached.levels):
+        assert (width, height) == (cachedWidth, cachedHeight)
+        assert np.array_equal(np.asarray(data), np.asarray(cachedData))
+
+
+def test_texture_cache_invalidated_by_edit(shadows, image):
+
+    cached = shadows.Material(image, upload = False)
+    pixels = np.asarray(Image.open(image)).copy()
+    pixels[0, 0] ^= 255
+    Image.fromarray(pixels, "RGBA").save(image)
+    stat = os.stat(image)
+    os.utime(image, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    edited = shadows.Material(image, upload = False)
+    assert not np.array_equal(np.asarray(cached.levels[0][2]), np.asarray(edited.levels[0][2]))
+
+
+def test_texture_formats_keep_separate_caches(shadows, image, monkeypatch):
+
+    rgba = shadows.Material(image, upload = False)
+    shadows.Material(image, upload = False, compression = "BC1")
+
+    forbid(monkeypatch, shadows.Material, "decodeImage")
+    assert np.array_equal(np.asarray(shadows.Material(image, upload = False).levels[0][2]), np.asarray(rgba.levels[0][2]))
+    assert shadows.Material(image, upload = False, compression = "BC1").format == "BC1"
+
+
+@pytest.mark.parametrize("setting, value", [("LOD_REDUCTION", 0.3), ("LOD_LEVELS", 2), ("LOD_MAX_TRIANGLES", 1)])
+def test_mesh_cache_invalidated_by_lod_settings(shadows, model, monkeypatch, setting, value):
+
+    cached = shadows.Mesh(model, upload = False)
+    monkeypatch.setattr(shadows, setting, value)
+
+    parsed = []
+    loadMesh = shadows.Mesh.loadMesh
+    monkeypatch.setattr(shadows.Mesh, "loadMesh", lambda self, filename: parsed.append(filename) or loadMesh(self, filename))
+    rebuilt = shadows.Mesh(model, upload = False)
+    assert parsed == [model]
+    assert not np.array_equal(cached.lods, rebuilt.lods)
+
+    #the rebuilt cache carries the new settings
+    forbid(monkeypatch, shadows.Mesh, "loadMesh")
+    assert_same_mesh(rebuilt, shadows.Mesh(model, upload = False))
@@ -0,0 +1,76 @@
+import pytest
+
+
+class FakeTime:
+
+
+    def __init__(self, lateness = 0.0002):
+
+        #every clock read moves time on a microsecond, every sleep wakes up a little late
+        self.now = 0.0
+        self.lateness = lateness
+        self.slept = 0.0
+        self.spins = 0
+
+    def perf_counter(self):
+
+        self.now += 1e-6
+        self.spins += 1
+        return self.now
+
+    def sleep(self, seconds):
+
+        self.now += seconds + self.lateness
+        self.slept += seconds
+
+
+@pytest.fixture
+def fake_time(shadows, monkeypatch):
+
+    fake = FakeTime()
+    monkeypatch.setattr(shadows, "time", fake)
+    return fake
+
+
+def test_steps_accumulate_and_carry_the_remainder(shadows):
+
+    clock = shadows.FrameClock(step = 0.01, frameCap = 0)
+    clock.accumulator = 0.025
+    assert clock.steps() == 2
+    assert clock.accumulator == pytest.approx(0.005)
+    assert clock.alpha == pytest.approx(0.5)
+
+    #the remainder is added to the next frame's time
+    clock.accumulator += 0.006
+    assert clock.steps() == 1
+    assert clock.alpha == pytest.approx(0.1)
+
+
+def test_stall_is_clamped(shadows, fake_time):
+
+    #a power of two step keeps the float division exact
+    step = 1 / 64
+    clock = shadows.FrameClock(step = step, frameCap = 0)
+    fake_time.now += 10.0
+    clock.tick()
+    assert clock.delta == shadows.MAX_FRAME_DELTA
+
+    #steps past the limit are dropped rather than carried into the next frames
+    assert clock.steps() == min(int(shadows.MAX_FRAME_DELTA / step), shadows.MAX_SIMULATION_STEPS)
+    assert clock.accumulator < step
+    clock.tick()
+    assert clock.steps() == 0
+
+
+def test_limit_sleeps_most_of_the_frame(shadows, fake_time):
+
+    clock = shadows.FrameClock(frameCap = 60)
+    for frame in range(30):
+        fake_time.now += 0.004
+        spins = fake_time.spins
+        clock.limit()
+        #the frame ends at its deadline, late by no more than a sleep's lateness
+        assert clock.deadline <= fake_time.now <= clock.deadline + fake_time.lateness + 1e-5
+        #the spin at the end is bounded, one clock read per microsecond
+        assert fake_time.spins - spins <= (shadows.SLEEP_SPIN_LIMIT + shadows.SLEEP_SLICE) * 1e6
+    assert clock.oversleep <= shadows.SLEEP_SPIN_LIMIT + fake_time.lateness
@@ -0,0 +1,142 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+
+
+def grid(size = 48, seed = 0):
+
+    #a gently rolling heightfield, one vertex per grid point, two triangles per cell
+    rng = np.random.default_rng(seed)
+    x, y = np.meshgrid(np.linspace(-4, 4, size), np.linspace(-4, 4, size))
+    z = 0.3 * np.sin(x) * np.cos(y) + rng.normal(0, 0.002, x.shape)
+    vertices = np.zeros((size * size, 8), dtype=np.float32)
+    vertices[:, 0:3] = np.stack((x, y, z), axis = -1).reshape(-1, 3)
+    vertices[:, 3:5] = np.stack((x, y), axis = -1).reshape(-1, 2) / 8 + 0.5
+    vertices[:, 7] = 1
+    corner = (np.arange(size - 1)[:, None] * size + np.arange(size - 1)).ravel()
+    triangles = np.concatenate((
+        np.stack((corner, corner + 1, corner + size + 1), axis = 1),
+        np.stack((corner, corner + size + 1, corner + size), axis = 1),
+    ))
+    return vertices.ravel(), triangles.ravel().astype(np.uint32)
+
+
+def shade(shadows):
+
+    mesh = shadows.Mesh.__new__(shadows.Mesh)
+    vertices, indices, submeshes = mesh.loadMesh(str(ROOT / "models" / "shade_smooth.obj"))
+    return vertices, indices
+
+
+def assert_valid_levels(shadows, vertices, indices, levels):
+
+    vertexCount = len(vertices) // 8
+    assert np.array_equal(np.asarray(levels[0][0]).ravel(), indices)
+    assert levels[0][1] == 0
+    for (coarser, error), (finer, finerError) in zip(levels[1:], levels):
+        #every level is a real reduction of the one before, and its error never shrinks
+        assert len(coarser) < len(finer)
+        assert len(coarser) <= len(finer) * (1 + shadows.LOD_REDUCTION) / 2
+        assert error >= finerError
+    for triangles, error in levels:
+        triangles = np.asarray(triangles).reshape(-1, 3)
+        assert len(triangles) > 0
+        assert triangles.min() >= 0 and triangles.max() < vertexCount
+        #no collapsed or repeated faces
+        assert (triangles[:, 0] != triangles[:, 1]).all()
+        assert (triangles[:, 1] != triangles[:, 2]).all()
+        assert (triangles[:, 2] != triangles[:, 0]).all()
+        assert len(np.unique(np.sort(triangles, axis = 1), axis = 0)) == len(triangles)
+
+
+@pytest.mark.parametrize("mesh", ["grid", "shade"])
+def test_levels_decrease_and_stay_valid(shadows, mesh):
+
+    vertices, indices = grid() if mesh == "grid" else shade(shadows)
+    levels = shadows.build_lods(vertices, indices)
+    assert len(levels) > 1
+    assert_valid_levels(shadows, vertices, indices, levels)
+
+
+def test_open_boundary_stays_put(shadows):
+
+    #the grid's outline is open, its vertices are locked so the coarsest level still covers the same square
+    vertices, indices = grid()
+    levels = shadows.build_lods(vertices, indices)
+    positions = vertices.reshape(-1, 8)[:, 0:3]
+    used = positions[np.unique(levels[-1][0])]
+    assert np.allclose(used[:, 0:2].min(axis = 0), [-4, -4])
+    assert np.allclose(used[:, 0:2].max(axis = 0), [4, 4])
+    triangles = np.asarray(levels[-1][0]).reshape(-1, 3)
+    first = positions[triangles[:, 1], 0:2] - positions[triangles[:, 0], 0:2]
+    second = positions[triangles[:, 2], 0:2] - positions[triangles[:, 0], 0:2]
+    area = np.abs(first[:, 0] * second[:, 1] - first[:, 1] * second[:, 0]).sum() / 2
+    assert area == pytest.approx(64, rel = 1e-3)
+
+
+def test_over_budget_meshes_keep_only_the_full_level(shadows):
+
+    vertices, indices = grid()
+    levels = shadows.build_lods(vertices, indices, maxTriangles = len(indices) // 3 - 1)
+    assert len(levels) == 1
+    assert np.array_equal(np.asarray(levels[0][0]).ravel(), indices)
+
+
+def test_mesh_lod_table_addresses_its_index_buffer(shadows, tmp_path):
+
+    model = tmp_path / "shade_smooth.obj"
+    shutil.copy(ROOT / "models" / "shade_smooth.obj", model)
+    mesh = shadows.Mesh(str(model), upload = False)
+    vertices, indices = shade(shadows)
+
+    #the full mesh first, each coarser level straight after the one before, in the mesh's own index type
+    assert mesh.lods["firstIndex"][0] == 0
+    assert (mesh.lods["firstIndex"][1:] == mesh.lods["firstIndex"][:-1] + mesh.lods["indexCount"][:-1]).all()
+    assert mesh.lods["firstIndex"][-1] + mesh.lods["indexCount"][-1] == len(mesh.indices)
+    assert mesh.indices.dtype == indices.dtype
+    levels = [
+        (mesh.indices[first:first + count], error)
+        for first, count, error in zip(mesh.lods["firstIndex"], mesh.lods["indexCount"], mesh.lods["error"])
+    ]
+    assert_valid_levels(shadows, vertices, indices, levels)
+
+
+def write_split_grid(path, size = 40):
+
+    #the grid as an obj, its cells in four bands that alternate between two materials
+    vertices, indices = grid(size)
+    rows = vertices.reshape(-1, 8)
+    lines = [f"v {x:.6f} {y:.6f} {z:.6f}" for x, y, z in rows[:, 0:3]]
+    lines += [f"vt {s:.6f} {t:.6f}" for s, t in rows[:, 3:5]]
+    lines += ["vn 0 0 1"]
+    triangles = indices.reshape(-1, 3) + 1
+    bands = np.array_split(np.argsort(rows[triangles[:, 0] - 1, 1], kind = "stable"), 4)
+    for band, faces in enumerate(bands):
+        lines.append(f"usemtl {'ab'[band % 2]}")
+        lines += [f"f {a}/{a}/1 {b}/{b}/1 {c}/{c}/1" for a, b, c in triangles[np.sort(faces)]]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_submeshes_stay_grouped_in_every_level(shadows, tmp_path):
+
+    mesh = shadows.Mesh(write_split_grid(tmp_path / "bands.obj"), upload = False)
+    assert [submesh.material for submesh in mesh.submeshes] == ["a", "b", "a", "b"]
+    assert len(mesh.lods) > 1
+
+    ranges = mesh.submeshLods
+    assert ranges.shape == (len(mesh.lods), 4, 2)
+    assert ranges[0].tolist() == [[submesh.first_index, submesh.index_count] for submesh in mesh.submeshes]
+    starts = shadows.submesh_vertex_starts(mesh.indices, mesh.submeshes).tolist() + [mesh.vertex_count]
+    for level, lod in zip(ranges, mesh.lods):
+        #each level is split into back to back runs, one per submesh, that only use that submesh's vertices
+        assert level[0, 0] == lod["firstIndex"]
+        assert (level[1:, 0] == level[:-1, 0] + level[:-1, 1]).all()
+        assert level[:, 1].sum() == lod["indexCount"]
+        for submesh, (first, count) in enumerate(level):
+            corners = mesh.indices[first:first + count]
+            assert count > 0
+            assert corners.min() >= starts[submesh] and corners.max() < starts[submesh + 1]
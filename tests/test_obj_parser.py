@@ -0,0 +1,113 @@
+import random
+
+import numpy as np
+import pytest
+
+from conftest import ROOT
+
+
+def baseline_load_mesh(filename):
+
+    #the original line by line parser, every triangle corner written out as x, y, z, s, t, nx, ny, nz
+    v = []
+    vt = []
+    vn = []
+    vertices = []
+    with open(filename, "r") as f:
+        for line in f:
+            flag = line[0:line.find(" ")]
+            if flag == "v":
+                v.append([float(x) for x in line.replace("v ", "").split(" ")])
+            elif flag == "vt":
+                vt.append([float(x) for x in line.replace("vt ", "").split(" ")])
+            elif flag == "vn":
+                vn.append([float(x) for x in line.replace("vn ", "").split(" ")])
+            elif flag == "f":
+                corners = line.replace("f ", "").replace("\n", "").split(" ")
+                face = []
+                for corner in corners:
+                    position, texture, normal = (int(i) - 1 for i in corner.split("/"))
+                    face.append(v[position] + vt[texture] + vn[normal])
+                for i in range(len(corners) - 2):
+                    for corner in (0, i + 1, i + 2):
+                        vertices.extend(face[corner])
+    return np.array(vertices, dtype=np.float32).reshape(-1, 8)
+
+
+def write_obj(path, seed, groups = 12, faces = 400):
+
+    #triangles, quads and pentagons over shared v/vt/vn records, split by o and usemtl lines
+    rng = random.Random(seed)
+    positions, textures, normals = 300, 120, 60
+    lines = [f"v {rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f} {rng.uniform(-5, 5):.6f}" for _ in range(positions)]
+    lines += [f"vt {rng.random():.6f} {rng.random():.6f}" for _ in range(textures)]
+    lines += [f"vn {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f} {rng.uniform(-1, 1):.6f}" for _ in range(normals)]
+    for group in range(groups):
+        if group % 3 == 0:
+            lines.append(f"o part{group}")
+        lines.append(f"usemtl material{group % 4}")
+        for _ in range(rng.randint(1, faces)):
+            corners = rng.choice((3, 3, 4, 5))
+            lines.append("f " + " ".join(
+                f"{rng.randint(1, positions)}/{rng.randint(1, textures)}/{rng.randint(1, normals)}"
+                for _ in range(corners)
+            ))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def load(shadows, filename):
+
+    mesh = shadows.Mesh.__new__(shadows.Mesh)
+    return mesh.loadMesh(filename)
+
+
+@pytest.mark.parametrize("model", ["cube.obj", "ground.obj", "shade_smooth.obj"])
+def test_models_match_baseline_parser(shadows, model):
+
+    filename = str(ROOT / "models" / model)
+    vertices, indices, submeshes = load(shadows, filename)
+
+    expected = baseline_load_mesh(filename)
+    assert np.array_equal(vertices.reshape(-1, 8)[indices], expected)
+    assert sum(submesh.index_count for submesh in submeshes) == len(indices)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_chunked_parse_matches_baseline_parser(shadows, tmp_path, monkeypatch, seed):
+
+    #small chunks put face runs, submesh changes and shared corners across chunk boundaries
+    filename = write_obj(tmp_path / "mixed.obj", seed)
+    monkeypatch.setattr(shadows, "OBJ_CHUNK_SIZE", 4096)
+    vertices, indices, submeshes = load(shadows, filename)
+
+    expected = baseline_load_mesh(filename)
+    assert np.array_equal(vertices.reshape(-1, 8)[indices], expected)
+
+
+def test_submeshes_number_vertices_by_first_use(shadows, tmp_path, monkeypatch):
+
+    filename = write_obj(tmp_path / "mixed.obj", 4)
+    monkeypatch.setattr(shadows, "OBJ_CHUNK_SIZE", 4096)
+    vertices, indices, submeshes = load(shadows, filename)
+    rows = vertices.reshape(-1, 8)
+
+    assert [(s.object_name, s.material) for s in submeshes][:4] == [
+        ("part0", "material0"), ("part0", "material1"), ("part0", "material2"), ("part3", "material3"),
+    ]
+    vertexBase = 0
+    for submesh in submeshes:
+        corners = indices[submesh.first_index:submesh.first_index + submesh.index_count].astype(np.int64)
+        distinct, firstUse = np.unique(corners, return_index = True)
+        #each submesh owns a contiguous run of vertices, handed out in the order its corners use them
+        assert np.array_equal(distinct[np.argsort(firstUse)], np.arange(vertexBase, vertexBase + len(distinct)))
+        #and no v/vt/vn combination appears twice in it
+        assert len(np.unique(rows[distinct], axis = 0)) == len(distinct)
+        vertexBase += len(distinct)
+    assert vertexBase == len(rows)
+
+
+def test_small_meshes_use_short_indices(shadows):
+
+    vertices, indices, submeshes = load(shadows, str(ROOT / "models" / "cube.obj"))
+    assert indices.dtype == np.uint16
@@ -0,0 +1,206 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pyrr
+import pytest
+
+from conftest import ROOT
+
+#cpu seconds a frame's shadow pass may take in the large scene test, half a 60 fps frame
+SHADOW_CPU_BUDGET = 0.008
+
+
+def populate(shadows, seed, count = 400, spread = 80):
+
+    #randomly placed and rotated rows with off-centre spheres, a few far outside the tree or bigger than it
+    rng = np.random.default_rng(seed)
+    transforms = shadows.TransformStore()
+    for _ in range(count):
+        transforms.add(rng.uniform(-spread, spread, 3), rng.uniform(0, 360, 3))
+    transforms.positions[0:5] = [[700, 0, 0], [0, -900, 0], [0, 0, 530], [-2000, 40, 10], [0, 0, 0]]
+    transforms.update(np.eye(4, dtype=np.float32))
+
+    index = shadows.SpatialIndex(transforms)
+    radii = rng.uniform(0.05, 6, count).astype(np.float32)
+    radii[4] = 800
+    rows = np.arange(count)
+    index.ensure(count)
+    index.localCenters[rows] = rng.uniform(-1, 1, (count, 3))
+    index.localRadii[rows] = radii
+    index.update(rows)
+    return transforms, index, rng
+
+
+def world_spheres(index, transforms):
+
+    models = transforms.models[:transforms.count]
+    centers = np.einsum("nj,nji->ni", index.localCenters[:transforms.count], models[:, :3, :3]) + models[:, 3, :3]
+    return centers, index.localRadii[:transforms.count]
+
+
+def brute_sphere(index, transforms, center, radius):
+
+    centers, radii = world_spheres(index, transforms)
+    return np.flatnonzero(np.linalg.norm(centers - center, axis = 1) <= radius + radii)
+
+
+def brute_frustum(index, transforms, planes):
+
+    centers, radii = world_spheres(index, transforms)
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    return np.flatnonzero((distances >= -radii[:, None]).all(axis = 1))
+
+
+def brute_ray(index, transforms, origin, direction, maxDistance):
+
+    centers, radii = world_spheres(index, transforms)
+    direction = direction / np.linalg.norm(direction)
+    offsets = centers - origin
+    along = offsets @ direction
+    missed = (offsets ** 2).sum(axis = 1) - along ** 2
+    halfChord = np.sqrt(np.maximum(radii ** 2 - missed, 0))
+    entry = np.maximum(along - halfChord, 0)
+    hit = (missed <= radii ** 2) & (along + halfChord >= 0) & (entry <= maxDistance)
+    return np.flatnonzero(hit), entry[hit]
+
+
+def camera_planes(shadows, rng):
+
+    eye = rng.uniform(-60, 60, 3)
+    view = pyrr.matrix44.create_look_at(eye, rng.uniform(-20, 20, 3), [0, 0, 1], dtype=np.float32)
+    projection = pyrr.matrix44.create_perspective_projection(rng.uniform(30, 90), 4 / 3, 0.1, rng.uniform(30, 200),
+                                                             dtype=np.float32)
+    return shadows.frustum_planes(view @ projection)
+
+
+def assert_matches_brute_force(shadows, transforms, index, rng):
+
+    for _ in range(20):
+        center, radius = rng.uniform(-100, 100, 3), rng.uniform(0, 40)
+        assert sorted(index.query_sphere(center, radius)) == sorted(brute_sphere(index, transforms, center, radius))
+
+        planes = camera_planes(shadows, rng)
+        assert sorted(index.query_frustum(planes)) == sorted(brute_frustum(index, transforms, planes))
+
+        origin, direction = rng.uniform(-100, 100, 3), rng.normal(size = 3)
+        maxDistance = rng.choice([np.inf, rng.uniform(10, 150)])
+        rows, distances = index.query_ray(origin, direction, maxDistance)
+        expectedRows, expectedDistances = brute_ray(index, transforms, origin, direction, maxDistance)
+        assert sorted(rows) == sorted(expectedRows)
+        #nearest first, at the distance each sphere is entered
+        assert (np.diff(distances) >= 0).all()
+        order = np.argsort(expectedRows)
+        np.testing.assert_allclose(distances[np.argsort(rows)], expectedDistances[order], rtol = 1e-4, atol = 1e-3)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_queries_match_brute_force(shadows, seed):
+
+    transforms, index, rng = populate(shadows, seed)
+    #rows past the root cell or bigger than it are kept aside and still found
+    assert {0, 1, 3, 4} <= index.outside
+    assert_matches_brute_force(shadows, transforms, index, rng)
+
+
+@pytest.mark.parametrize("seed", [2, 3])
+def test_queries_match_brute_force_after_moves(shadows, seed):
+
+    transforms, index, rng = populate(shadows, seed)
+    for step in range(3):
+        moved = rng.choice(transforms.count, 120, replace = False)
+        #small nudges that stay in their cells, long moves across the tree, and moves out of and back into it
+        transforms.positions[moved[:40]] += rng.uniform(-0.2, 0.2, (40, 3))
+        transforms.positions[moved[40:100]] = rng.uniform(-80, 80, (60, 3))
+        transforms.positions[moved[100:110]] = rng.uniform(520, 900, (10, 3)) * rng.choice([-1, 1], (10, 3))
+        transforms.positions[0:5] = rng.uniform(-80, 80, (5, 3))
+        transforms.eulers[moved] = rng.uniform(0, 360, (120, 3))
+        index.update(transforms.update(np.eye(4, dtype=np.float32)))
+        assert_matches_brute_force(shadows, transforms, index, rng)
+
+    #every row is stored exactly once, in the tree or aside
+    stored = [row for cells in index.cells for rows in cells.values() for row in rows] + list(index.outside)
+    assert sorted(stored) == list(range(transforms.count))
+
+
+def test_cell_counts_follow_removals(shadows):
+
+    transforms, index, rng = populate(shadows, 4)
+    for row in range(transforms.count):
+        index.remove(row)
+        index.levels[row] = -1
+    assert index.outside == set()
+    assert all(not cells for cells in index.cells)
+    assert all(not counts for counts in index.counts)
+
+
+@pytest.fixture(scope = "module")
+def headless_app(shadows):
+
+    #the full scene through EGL, the tests that use it are skipped where either is missing
+    if not all((ROOT / "models" / name).exists() for name in ("base_smooth.obj", "bulb.obj")):
+        pytest.skip("scene models are not in this checkout")
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = shadows.HeadlessApp()
+    except Exception as error:
+        os.chdir(cwd)
+        pytest.skip(f"no headless OpenGL context: {error}")
+    yield app
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.quit()
+    os.chdir(cwd)
+
+
+def look(app, theta, phi):
+
+    app.place_camera({"position": [0, 0, 2], "theta": theta, "phi": phi})
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.run(frames = 1)
+    return app.renderer.pick(app.scene)
+
+
+def test_pick_under_crosshair(headless_app):
+
+    item, component = look(headless_app, 0, -60)
+    assert item.name == "moveable_object"
+    assert component is headless_app.scene.moveable_object
+
+    item, component = look(headless_app, 0, -10)
+    assert item.name in ("bulb", "shade", "base")
+
+    assert look(headless_app, 180, 30) is None
+
+
+def test_large_static_scene_keeps_shadows_cheap(headless_app, shadows):
+
+    #50k static copies around one moving object, the shadow pass must not walk the copies every frame
+    app = headless_app
+    scene = app.scene
+    app.scene = shadows.Scene()
+    try:
+        rows = np.arange(50000)
+        positions = np.stack((rows % 224 - 112, rows // 224 - 112, np.full(len(rows), -1.5)), axis = 1) * 1.5
+        app.scene.shade = [app.scene.shade] + [
+            shadows.SimpleComponent(app.scene.transforms, position, [0, 0, 0]) for position in positions
+        ]
+        #looking straight up, so the main pass has nothing to draw and only the shadow pass is measured
+        app.place_camera({"position": [0, 0, 2], "theta": 0, "phi": 89})
+
+        shadowTimes = []
+        for frame in range(20):
+            app.scene.moveable_object.position = [2 + 0.05 * frame, 0, -1]
+            with contextlib.redirect_stdout(io.StringIO()):
+                app.run(frames = 1)
+            if frame == 4:
+                bakes = app.renderer.staticShadowBakes
+            elif frame > 4:
+                shadowTimes.append(app.renderer.stageTimes["shadow"])
+        assert app.renderer.staticShadowBakes == bakes
+        assert app.renderer.dynamicShadowCasters == 1
+        assert np.median(shadowTimes) < SHADOW_CPU_BUDGET
+    finally:
+        app.scene = scene
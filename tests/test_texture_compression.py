@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from conftest import ROOT
+
+
+def expand565(color):
+
+    color = color.astype(np.int64)
+    r, g, b = (color >> 11) & 31, (color >> 5) & 63, color & 31
+    return np.stack(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)), axis = -1).astype(np.float64)
+
+
+def decode_colors(blocks, alwaysFourColors):
+
+    #the way the gpu reads a color block: color0 <= color1 selects the 3 color mode, except in BC3
+    end0, end1 = expand565(blocks["color0"]), expand565(blocks["color1"])
+    fourColors = ((blocks["color0"] > blocks["color1"]) | alwaysFourColors)[:, None]
+    palette = np.stack((
+        end0, end1,
+        np.where(fourColors, (2 * end0 + end1) / 3, (end0 + end1) / 2),
+        np.where(fourColors, (end0 + 2 * end1) / 3, 0),
+    ), axis = 1)
+    codes = (blocks["colorBits"][:, None].astype(np.int64) >> (2 * np.arange(16))) & 3
+    return np.take_along_axis(palette, codes[:, :, None], axis = 1)
+
+
+def decode_alpha(blocks):
+
+    alpha0 = blocks["alpha0"].astype(np.float64)[:, None]
+    alpha1 = blocks["alpha1"].astype(np.float64)[:, None]
+    steps = np.arange(1, 7)
+    eight = np.concatenate((alpha0, alpha1, ((7 - steps) * alpha0 + steps * alpha1) / 7), axis = 1)
+    steps = np.arange(1, 5)
+    six = np.concatenate((alpha0, alpha1, ((5 - steps) * alpha0 + steps * alpha1) / 5,
+                          np.zeros_like(alpha0), np.full_like(alpha0, 255)), axis = 1)
+    palette = np.where(alpha0 > alpha1, eight, six)
+    bits = (blocks["alphaBits"].astype(np.int64) << (8 * np.arange(6))).sum(axis = 1)
+    codes = (bits[:, None] >> (3 * np.arange(16))) & 7
+    return np.take_along_axis(palette, codes, axis = 1)
+
+
+def round_trip(shadows, rgba, textureFormat):
+
+    #compressed and decoded again, as (blocks, 16 texels, 4 channels) next to the source blocks
+    height, width = rgba.shape[:2]
+    data = shadows.compress_texture(rgba.ravel(), width, height, textureFormat)
+    assert len(data) == shadows.compressed_size(textureFormat, width, height)
+    blockType = shadows.BC1_BLOCK if textureFormat == "BC1" else shadows.BC3_BLOCK
+    blocks = data.view(blockType)
+    decoded = np.empty(blocks.shape + (16, 4))
+    decoded[:, :, 0:3] = decode_colors(blocks, textureFormat == "BC3")
+    decoded[:, :, 3] = decode_alpha(blocks) if textureFormat == "BC3" else 255
+    return shadows.split_blocks(rgba.ravel(), width, height).astype(np.float64), decoded
+
+
+def blocks_of(tiles):
+
+    #(blocks, 4, 4, 4) tiles laid side by side in one row
+    return np.concatenate(list(tiles), axis = 1).astype(np.uint8)
+
+
+@pytest.mark.parametrize("textureFormat", ["BC1", "BC3"])
+def test_flat_blocks_only_lose_565_precision(shadows, textureFormat):
+
+    levels = np.arange(0, 256, 3)
+    colors = np.stack((levels, levels[::-1], np.roll(levels, 20), np.full_like(levels, 255)), axis = 1)
+    rgba = blocks_of(np.broadcast_to(color, (4, 4, 4)) for color in colors)
+    source, decoded = round_trip(shadows, rgba, textureFormat)
+
+    #5 bit channels are at most half a step of 255 / 31 off, the 6 bit green half of 255 / 63
+    error = np.abs(source - decoded)[:, :, 0:3].max(axis = (0, 1))
+    assert (error <= [255 / 62 + 1, 255 / 126 + 1, 255 / 62 + 1]).all()
+
+
+@pytest.mark.parametrize("textureFormat", ["BC1", "BC3"])
+def test_two_color_blocks_are_exact(shadows, textureFormat):
+
+    #colors already on the 5:6:5 grid are endpoints the block can hold as they are
+    rng = np.random.default_rng(3)
+    tiles = []
+    for _ in range(64):
+        pair = expand565(rng.integers(0, 65536, 2)).astype(np.uint8)
+        choice = rng.integers(0, 2, (4, 4))
+        tiles.append(np.concatenate((pair[choice], np.full((4, 4, 1), 255, dtype=np.uint8)), axis = 2))
+    source, decoded = round_trip(shadows, blocks_of(tiles), textureFormat)
+    assert np.abs(source - decoded).max() <= 1
+
+
+def test_gradients_stay_within_interpolation_error(shadows):
+
+    #a ramp across a block lands at most a sixth of its range from the nearest palette entry
+    ramp = np.linspace(0, 1, 4)
+    tiles = []
+    for span in (12, 48, 120, 240):
+        row = np.stack((10 + span * ramp, 10 + span * ramp / 2, 245 - span * ramp, np.full(4, 255)), axis = 1)
+        tiles.append(np.broadcast_to(row, (4, 4, 4)))
+    source, decoded = round_trip(shadows, blocks_of(tiles), "BC1")
+    error = np.abs(source - decoded)[:, :, 0:3].max(axis = (1, 2))
+    assert (error <= np.array([12, 48, 120, 240]) / 6 + 255 / 62 + 1).all()
+
+
+def test_alpha_within_half_a_step(shadows):
+
+    rng = np.random.default_rng(5)
+    rgba = rng.integers(0, 256, (16, 32, 4)).astype(np.uint8)
+    #flat alpha blocks and blocks that span the full range
+    rgba[0:4, 0:4, 3] = 77
+    rgba[4:8, 0:4, 3] = np.where(rng.integers(0, 2, (4, 4)), 0, 255)
+    source, decoded = round_trip(shadows, rgba, "BC3")
+
+    alpha = source[:, :, 3]
+    step = (alpha.max(axis = 1) - alpha.min(axis = 1)) / 7
+    assert (np.abs(alpha - decoded[:, :, 3]) <= step[:, None] / 2 + 1).all()
+
+
+@pytest.mark.parametrize("textureFormat", ["BC1", "BC3"])
+def test_photo_error(shadows, textureFormat):
+
+    rgba = np.asarray(Image.open(ROOT / "gfx" / "wood.jpeg").convert("RGBA"))
+    source, decoded = round_trip(shadows, rgba, textureFormat)
+    rootMeanSquare = np.sqrt(((source - decoded)[:, :, 0:3] ** 2).mean())
+    assert rootMeanSquare < 5
+    assert np.abs(source - decoded)[:, :, 0:3].max() < 48
+
+
+def test_partial_edge_blocks(shadows):
+
+    #10 x 6 pads out to 3 x 2 blocks, the padding repeats the last row and column
+    rgba = np.random.default_rng(9).integers(0, 256, (6, 10, 4)).astype(np.uint8)
+    source, decoded = round_trip(shadows, rgba, "BC3")
+    assert source.shape == (6, 16, 4)
+    padded = source.reshape(2, 3, 4, 4, 4).transpose(0, 2, 1, 3, 4).reshape(8, 12, 4)
+    assert np.array_equal(padded[6:, :10], np.broadcast_to(padded[5:6, :10], (2, 10, 4)))
+    assert np.array_equal(padded[:, 10:], np.broadcast_to(padded[:, 9:10], (8, 2, 4)))
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def fill(shadows, count = 50000, moving = 1):
+
+    #a large store of static rows with a few dynamic ones at the front, all matrices built once
+    transforms = shadows.TransformStore()
+    rng = np.random.default_rng(0)
+    for row in range(count):
+        transforms.add(rng.uniform(-100, 100, 3), rng.uniform(0, 360, 3), static = row >= moving)
+    transforms.update(np.eye(4, dtype=np.float32))
+    return transforms
+
+
+def test_static_mask_follows_components(shadows):
+
+    transforms = shadows.TransformStore(capacity = 2)
+    components = [shadows.SimpleComponent(transforms, [i, 0, 0], [0, 0, 0], static = i % 2 == 0) for i in range(5)]
+    #the mask grows with the store and stays in step with every component
+    assert transforms.static[:transforms.count].tolist() == [True, False, True, False, True]
+    assert [component.static for component in components] == [True, False, True, False, True]
+
+
+def test_moving_dynamic_rows_keep_the_static_version(shadows):
+
+    transforms = fill(shadows)
+    version = transforms.staticVersion
+    for step in range(5):
+        transforms.positions[0] += 0.1
+        assert transforms.update(np.eye(4, dtype=np.float32)).tolist() == [0]
+    assert transforms.staticVersion == version
+
+
+def test_static_changes_raise_the_static_version(shadows):
+
+    transforms = fill(shadows)
+    identity = np.eye(4, dtype=np.float32)
+
+    version = transforms.staticVersion
+    transforms.eulers[1234, 2] += 1
+    assert transforms.update(identity).tolist() == [1234]
+    assert transforms.staticVersion > version
+
+    #nothing moved, nothing changed
+    version = transforms.staticVersion
+    assert len(transforms.update(identity)) == 0
+    assert transforms.staticVersion == version
+
+    #turning a row dynamic takes it out of the bake, setting the same flag again does nothing
+    transforms.set_static(1234, False)
+    assert transforms.staticVersion == version + 1
+    transforms.set_static(1234, False)
+    assert transforms.staticVersion == version + 1
+
+    #a static row added later is built on the next update
+    transforms.add([0, 0, 0], [0, 0, 0])
+    transforms.update(identity)
+    assert transforms.staticVersion == version + 2